@@ -0,0 +1,38 @@
+"""The available game state implementations, selectable by name.
+"""
+from .board import GameState
+from .bitboard import BitboardGameState
+
+DEFAULT_BACKEND = 'mailbox'
+
+BACKENDS = {
+    'mailbox': GameState,
+    'bitboard': BitboardGameState,
+}
+
+
+def get_backend(name):
+    """Returns the game state class registered under the given name.
+
+    :param name: The backend name, one of BACKENDS.
+    :return: The game state class.
+    """
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown board backend {}. Available backends: {}'.format(name, ', '.join(sorted(BACKENDS))))
+
+
+def convert_state(state, name):
+    """Returns the given state in the given backend. The state itself is returned if it already is in that backend.
+
+    :param state: Any game state.
+    :param name: The backend name, or None to keep the state as is.
+    :return: A game state of the requested backend.
+    """
+    if name is None:
+        return state
+    backend = get_backend(name)
+    if isinstance(state, backend):
+        return state
+    return backend.from_state(state)
@@ -0,0 +1,339 @@
+"""A bitboard implementation of the Reversi game state.
+
+The board is kept as two 64-bit integers: the discs of the player to move and the discs of his opponent.
+Square (x, y) is bit number x * BOARD_ROWS + y, so the bit order matches the raster order of the list based
+board.
+"""
+from __future__ import print_function, division
+from .consts import *
+from .zobrist import SQUARE_KEYS, FLIP_KEYS, SIDE_TO_MOVE_KEY, side_key
+
+FULL_MASK = (1 << (BOARD_COLS * BOARD_ROWS)) - 1
+
+# Masks of the squares that may be shifted in a direction with a y component without wrapping around a column.
+NOT_Y0_MASK = 0
+NOT_Y7_MASK = 0
+for _x in range(BOARD_COLS):
+    for _y in range(BOARD_ROWS):
+        if _y != 0:
+            NOT_Y0_MASK |= 1 << (_x * BOARD_ROWS + _y)
+        if _y != BOARD_ROWS - 1:
+            NOT_Y7_MASK |= 1 << (_x * BOARD_ROWS + _y)
+
+# (shift amount, mask applied before shifting) for each of the 8 directions.
+DIRECTIONS = []
+for _dx, _dy in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+    if _dy == 1:
+        _mask = NOT_Y7_MASK
+    elif _dy == -1:
+        _mask = NOT_Y0_MASK
+    else:
+        _mask = FULL_MASK
+    DIRECTIONS.append((_dx * BOARD_ROWS + _dy, _mask))
+
+
+def square_bit(x, y):
+    return 1 << (x * BOARD_ROWS + y)
+
+
+def shift(bits, amount, mask):
+    """Shifts all the discs in bits one step in a direction, dropping those that fall off the board."""
+    bits &= mask
+    if amount > 0:
+        return (bits << amount) & FULL_MASK
+    return bits >> -amount
+
+
+def moves_bits(own, opp):
+    """Returns a bitmask of all the legal moves of the player owning 'own'."""
+    empty = ~(own | opp) & FULL_MASK
+    moves = 0
+    for amount, mask in DIRECTIONS:
+        candidates = shift(own, amount, mask) & opp
+        for _ in range(5):
+            candidates |= shift(candidates, amount, mask) & opp
+        moves |= shift(candidates, amount, mask) & empty
+    return moves
+
+
+def flips_bits(own, opp, move_bit):
+    """Returns a bitmask of the discs flipped by placing a disc on move_bit. 0 means the move is illegal."""
+    flips = 0
+    for amount, mask in DIRECTIONS:
+        line = 0
+        cursor = shift(move_bit, amount, mask)
+        while cursor & opp:
+            line |= cursor
+            cursor = shift(cursor, amount, mask)
+        if cursor & own:
+            flips |= line
+    return flips
+
+
+def pop_count(bits):
+    return bin(bits).count('1')
+
+
+def bits_key(own, opp, curr_player):
+    """Computes the Zobrist key of a position given as bitboards from scratch."""
+    key = side_key(curr_player)
+    for player, bits in ((curr_player, own), (OPPONENT_COLOR[curr_player], opp)):
+        while bits:
+            low = bits & -bits
+            key ^= SQUARE_KEYS[player][low.bit_length() - 1]
+            bits ^= low
+    return key
+
+
+def iter_squares(bits):
+    """Yields the (x, y) coordinates of the set bits, in raster order."""
+    while bits:
+        low = bits & -bits
+        sq = low.bit_length() - 1
+        yield sq // BOARD_ROWS, sq % BOARD_ROWS
+        bits ^= low
+
+
+class BitboardColumnView:
+    __slots__ = ('state', 'x')
+
+    def __init__(self, state, x):
+        self.state = state
+        self.x = x
+
+    def __getitem__(self, y):
+        if not 0 <= y < BOARD_ROWS:
+            raise IndexError('board row out of range')
+        return self.state.cell(self.x, y)
+
+    def __len__(self):
+        return BOARD_ROWS
+
+    def __iter__(self):
+        return (self.state.cell(self.x, y) for y in range(BOARD_ROWS))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BitboardView:
+    """A read only board[x][y] view of a bitboard state, like the list based backend's BoardView. The view follows the
+    state it was created for, so it never needs to be refreshed.
+    """
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+    def __getitem__(self, x):
+        if not 0 <= x < BOARD_COLS:
+            raise IndexError('board column out of range')
+        return BitboardColumnView(self.state, x)
+
+    def __len__(self):
+        return BOARD_COLS
+
+    def __iter__(self):
+        return (self[x] for x in range(BOARD_COLS))
+
+    def __eq__(self, other):
+        if isinstance(other, BitboardView):
+            # The same discs, whichever side is to move in each state.
+            mine, theirs = self.state, other.state
+            if mine.curr_player == theirs.curr_player:
+                return mine.own == theirs.own and mine.opp == theirs.opp
+            return mine.own == theirs.opp and mine.opp == theirs.own
+        return [list(column) for column in self] == [list(column) for column in other]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr([list(column) for column in self])
+
+
+class BitboardGameState:
+    __slots__ = ('own', 'opp', '_curr_player', 'zobrist')
+
+    def __init__(self):
+        """ Initializing the board and current player.
+        """
+        # Starting pieces:
+        self.own = square_bit(3, 3) | square_bit(4, 4)
+        self.opp = square_bit(3, 4) | square_bit(4, 3)
+        self._curr_player = X_PLAYER
+        # The Zobrist key of the position, kept up to date by every method that changes the state.
+        self.zobrist = bits_key(self.own, self.opp, self._curr_player)
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds a bitboard state holding the same position as any other game state implementation."""
+        if isinstance(state, cls):
+            return state.__copy__()
+        new_state = cls()
+        x_bits = o_bits = 0
+        for x in range(BOARD_COLS):
+            for y in range(BOARD_ROWS):
+                if state.board[x][y] == X_PLAYER:
+                    x_bits |= square_bit(x, y)
+                elif state.board[x][y] == O_PLAYER:
+                    o_bits |= square_bit(x, y)
+        new_state._curr_player = state.curr_player
+        if state.curr_player == X_PLAYER:
+            new_state.own, new_state.opp = x_bits, o_bits
+        else:
+            new_state.own, new_state.opp = o_bits, x_bits
+        new_state.zobrist = bits_key(new_state.own, new_state.opp, new_state._curr_player)
+        return new_state
+
+    @property
+    def curr_player(self):
+        return self._curr_player
+
+    @curr_player.setter
+    def curr_player(self, player):
+        # The bitboards are relative to the player to move, so changing it swaps them.
+        if player != self._curr_player:
+            self.own, self.opp = self.opp, self.own
+            self._curr_player = player
+            self.zobrist ^= SIDE_TO_MOVE_KEY
+
+    @property
+    def board(self):
+        """A read only board[x][y] view of the position, for code written against the list based board."""
+        return BitboardView(self)
+
+    def get_moves_with_flips(self):
+        """Returns the valid moves in the (move, flips) form of the other backends, with None for the flips.
+
+        The moves come out of one moves_bits call, while the flips take a scan per move. Most of the moves generated
+        at a node are never played, since a cutoff skips the remaining ones, so make_move computes the flips of the
+        moves that actually are.
+
+        :return: A list of ([x, y], None) pairs in raster order.
+        """
+        return [([x, y], None) for x, y in iter_squares(moves_bits(self.own, self.opp))]
+
+    def get_possible_moves(self):
+        return [[x, y] for x, y in iter_squares(moves_bits(self.own, self.opp))]
+
+    def has_moves(self):
+        """Returns whether the player to move has a valid move."""
+        return moves_bits(self.own, self.opp) != 0
+
+    def perform_move(self, xstart, ystart):
+        return self.make_move([xstart, ystart]) != False
+
+    def perform_move_with_flips(self, move, flips):
+        """Performs a move whose flips were returned by get_moves_with_flips, without validating it again."""
+        self.make_move(move, flips)
+        return True
+
+    def make_move(self, move, flips=None):
+        """Performs a move in place and returns the record needed to take it back with unmake_move.
+
+        :param move: The [x, y] square to play.
+        :param flips: The move's flipped bits, or None to compute (and validate) them.
+        :return: An undo record (move bit, flipped bits, previous player, previous key), or False if the move is not
+                 valid.
+        """
+        move_bit = square_bit(move[0], move[1])
+        if flips is None:
+            if (self.own | self.opp) & move_bit:
+                return False
+            flips = flips_bits(self.own, self.opp, move_bit)
+            if not flips:
+                return False
+
+        # The player to move changes, so the new opponent discs are the old own discs plus the flipped ones.
+        prev_player = self._curr_player
+        prev_key = self.zobrist
+        self.own, self.opp = self.opp & ~flips, self.own | flips | move_bit
+        self._curr_player = OPPONENT_COLOR[prev_player]
+
+        key = prev_key ^ SQUARE_KEYS[prev_player][move_bit.bit_length() - 1] ^ SIDE_TO_MOVE_KEY
+        remaining = flips
+        while remaining:
+            low = remaining & -remaining
+            key ^= FLIP_KEYS[low.bit_length() - 1]
+            remaining ^= low
+        self.zobrist = key
+        return move_bit, flips, prev_player, prev_key
+
+    def unmake_move(self, undo):
+        """Takes back the move that returned the given undo record. Moves must be taken back in reverse order.
+
+        :param undo: The record returned by make_move.
+        """
+        move_bit, flips, prev_player, prev_key = undo
+        self.own, self.opp = self.opp & ~(flips | move_bit), self.own | flips
+        self._curr_player = prev_player
+        self.zobrist = prev_key
+
+    def cell(self, x, y):
+        """Returns the piece on (x, y): EM, X_PLAYER or O_PLAYER."""
+        bit = square_bit(x, y)
+        if self.own & bit:
+            return self._curr_player
+        if self.opp & bit:
+            return OPPONENT_COLOR[self._curr_player]
+        return EM
+
+    def disc_count(self, player):
+        """Returns the number of discs the given player has on the board."""
+        return pop_count(self.own if player == self._curr_player else self.opp)
+
+    def get_winner(self):
+        my_u = pop_count(self.own)
+        op_u = pop_count(self.opp)
+        if my_u > op_u:
+            return self.curr_player
+        elif my_u < op_u:
+            return OPPONENT_COLOR[self.curr_player]
+        else:
+            return TIE
+
+    def draw_board(self):
+    # This function prints out the board that it was passed. Returns None.
+        HLINE = '  +---+---+---+---+---+---+---+---+'
+
+        print(HLINE)
+        for y in range(BOARD_COLS):
+            print(y, end=' ')
+            for x in range(BOARD_ROWS):
+                print('| %s' % (self.board[x][y]), end=' ')
+            print('|')
+            print(HLINE)
+        print('    0   1   2   3   4   5   6   7')
+        print("\n" + self.curr_player + " Player Turn!\n\n")
+
+    def __copy__(self):
+        """Copies the state. There is nothing to share between states, so this is the same as a deep copy."""
+        new_state = BitboardGameState.__new__(BitboardGameState)
+        new_state.own = self.own
+        new_state.opp = self.opp
+        new_state._curr_player = self._curr_player
+        new_state.zobrist = self.zobrist
+        return new_state
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def __getstate__(self):
+        return self.own, self.opp, self._curr_player, self.zobrist
+
+    def __setstate__(self, state):
+        self.own, self.opp, self._curr_player, self.zobrist = state
+
+    def __hash__(self):
+        """This object can be inserted into a set or as dict key. NOTICE: Changing the object after it has been inserted
+        into a set or dict (as key) may have unpredicted results!!!
+        """
+        return self.zobrist
+
+    def __eq__(self, other):
+        return isinstance(other, BitboardGameState) and self.own == other.own and self.opp == other.opp and \
+            self.curr_player == other.curr_player
@@ -2,56 +2,214 @@
 """
 from __future__ import print_function, division
 from .consts import *
+from .zobrist import SQUARE_KEYS, FLIP_KEYS, SIDE_TO_MOVE_KEY, board_key
+
+# The cells of the flat board hold these codes instead of the piece strings.
+EM_CODE = 0
+CELL_CODES = {EM: EM_CODE, X_PLAYER: 1, O_PLAYER: 2}
+CELL_VALUES = (EM, X_PLAYER, O_PLAYER)
+
+
+DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+
+def square_index(x, y):
+    return x * BOARD_ROWS + y
+
+
+def _build_rays():
+    """Builds, for every square, the ordered flat indices of the squares along each direction.
+    Rays shorter than 2 squares can never flip anything, so they are left out.
+    """
+    rays = []
+    for x in range(BOARD_COLS):
+        for y in range(BOARD_ROWS):
+            square_rays = []
+            for xdirection, ydirection in DIRECTIONS:
+                ray = []
+                rx, ry = x + xdirection, y + ydirection
+                while 0 <= rx < BOARD_COLS and 0 <= ry < BOARD_ROWS:
+                    ray.append(square_index(rx, ry))
+                    rx += xdirection
+                    ry += ydirection
+                if len(ray) >= 2:
+                    square_rays.append(tuple(ray))
+            rays.append(tuple(square_rays))
+    return tuple(rays)
+
+# RAYS[square] holds the rays leaving the flat index square, NEIGHBORS[square] its adjacent squares.
+RAYS = _build_rays()
+NEIGHBORS = tuple(tuple(sorted(set(square_index(x + xdirection, y + ydirection)
+                                   for xdirection, ydirection in DIRECTIONS
+                                   if 0 <= x + xdirection < BOARD_COLS and 0 <= y + ydirection < BOARD_ROWS)))
+                  for x in range(BOARD_COLS) for y in range(BOARD_ROWS))
+
+
+class BoardColumnView:
+    __slots__ = ('cells', 'offset')
+
+    def __init__(self, cells, offset):
+        self.cells = cells
+        self.offset = offset
+
+    def __getitem__(self, y):
+        if not 0 <= y < BOARD_ROWS:
+            raise IndexError('board row out of range')
+        return CELL_VALUES[self.cells[self.offset + y]]
+
+    def __len__(self):
+        return BOARD_ROWS
+
+    def __iter__(self):
+        return (CELL_VALUES[code] for code in self.cells[self.offset:self.offset + BOARD_ROWS])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BoardView:
+    """A read only board[x][y] view of a flat board, for code written against the old list of lists board.
+    The view follows the board it was created for, so it never needs to be refreshed.
+    """
+    __slots__ = ('cells',)
+
+    def __init__(self, cells):
+        self.cells = cells
+
+    def __getitem__(self, x):
+        if not 0 <= x < BOARD_COLS:
+            raise IndexError('board column out of range')
+        return BoardColumnView(self.cells, x * BOARD_ROWS)
+
+    def __len__(self):
+        return BOARD_COLS
+
+    def __iter__(self):
+        return (self[x] for x in range(BOARD_COLS))
+
+    def __eq__(self, other):
+        if isinstance(other, BoardView):
+            return self.cells == other.cells
+        return [list(column) for column in self] == [list(column) for column in other]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr([list(column) for column in self])
+
 
 class GameState:
+    __slots__ = ('cells', 'board', '_curr_player', 'zobrist', 'frontier', 'counts')
+
     def __init__(self):
         """ Initializing the board and current player.
         """
-        self.board = []
-        for i in range(BOARD_COLS):
-            self.board.append([EM] * BOARD_ROWS)
+        # The board is one flat buffer of cell codes, square (x, y) being cells[x * BOARD_ROWS + y].
+        self.cells = bytearray(BOARD_COLS * BOARD_ROWS)
+        self.board = BoardView(self.cells)
 
-        for x in range(BOARD_COLS):
-            for y in range(BOARD_ROWS):
-                self.board[x][y] = EM
-        
         # Starting pieces:
-        self.board[3][3] = X_PLAYER
-        self.board[3][4] = O_PLAYER
-        self.board[4][3] = O_PLAYER
-        self.board[4][4] = X_PLAYER
+        self.cells[square_index(3, 3)] = CELL_CODES[X_PLAYER]
+        self.cells[square_index(3, 4)] = CELL_CODES[O_PLAYER]
+        self.cells[square_index(4, 3)] = CELL_CODES[O_PLAYER]
+        self.cells[square_index(4, 4)] = CELL_CODES[X_PLAYER]
                     
-        self.curr_player = X_PLAYER
+        self._curr_player = X_PLAYER
+        # The Zobrist key of the position, kept up to date by every method that changes the state.
+        self.zobrist = board_key(self.board, self._curr_player)
+        self._rebuild_frontier()
+
+    def _rebuild_frontier(self):
+        """Recomputes from scratch the frontier (the empty squares adjacent to at least one disc) and the disc count
+        of each cell code. Both are kept up to date incrementally afterwards.
+        """
+        cells = self.cells
+        self.frontier = set(sq for sq in range(BOARD_COLS * BOARD_ROWS)
+                            if cells[sq] == EM_CODE and any(cells[n] != EM_CODE for n in NEIGHBORS[sq]))
+        self.counts = [cells.count(code) for code in range(len(CELL_VALUES))]
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds a flat board state holding the same position as any other game state implementation."""
+        new_state = cls()
+        for x in range(BOARD_COLS):
+            for y in range(BOARD_ROWS):
+                new_state.cells[square_index(x, y)] = CELL_CODES[state.board[x][y]]
+        new_state._curr_player = state.curr_player
+        new_state.zobrist = board_key(new_state.board, new_state._curr_player)
+        new_state._rebuild_frontier()
+        return new_state
+
+    def __copy__(self):
+        """Copies the state. There is nothing to share between states, so this is the same as a deep copy."""
+        new_state = GameState.__new__(GameState)
+        new_state.cells = bytearray(self.cells)
+        new_state.board = BoardView(new_state.cells)
+        new_state._curr_player = self._curr_player
+        new_state.zobrist = self.zobrist
+        new_state.frontier = set(self.frontier)
+        new_state.counts = list(self.counts)
+        return new_state
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def __getstate__(self):
+        return bytes(self.cells), self._curr_player, self.zobrist
+
+    def __setstate__(self, state):
+        cells, self._curr_player, self.zobrist = state
+        self.cells = bytearray(cells)
+        self.board = BoardView(self.cells)
+        self._rebuild_frontier()
+
+    @property
+    def curr_player(self):
+        return self._curr_player
+
+    @curr_player.setter
+    def curr_player(self, player):
+        if player != self._curr_player:
+            self.zobrist ^= SIDE_TO_MOVE_KEY
+            self._curr_player = player
     
     def isOnBoard(self, x, y):
     # Returns True if the coordinates are located on the board.
         return x >= 0 and x <= 7 and y >= 0 and y <=7
 
     def isValidMove(self, xstart, ystart):
-        if self.board[xstart][ystart] != EM or not self.isOnBoard(xstart, ystart):
+        """Returns the [x, y] squares flipped by playing (xstart, ystart), or False if the move is not valid.
+        This walks the board step by step and is kept as the reference for the table driven move generation.
+        """
+        if not self.isOnBoard(xstart, ystart) or self.cells[square_index(xstart, ystart)] != EM_CODE:
             return False
 
-        self.board[xstart][ystart] = self.curr_player # temporarily set the tile on the board.
-
+        cells = self.cells
+        me = CELL_CODES[self._curr_player]
+        op = CELL_CODES[OPPONENT_COLOR[self._curr_player]]
         tilesToFlip = []
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+        for xdirection, ydirection in DIRECTIONS:
             x, y = xstart, ystart
             x += xdirection # first step in the direction
             y += ydirection # first step in the direction
-            if self.isOnBoard(x, y) and self.board[x][y] == OPPONENT_COLOR[self.curr_player]:
+            if self.isOnBoard(x, y) and cells[square_index(x, y)] == op:
                 # There is a piece belonging to the other player next to our piece.
                 x += xdirection
                 y += ydirection
                 if not self.isOnBoard(x, y):
                     continue
-                while self.board[x][y] == OPPONENT_COLOR[self.curr_player]:
+                while cells[square_index(x, y)] == op:
                     x += xdirection
                     y += ydirection
                     if not self.isOnBoard(x, y): # break out of while loop, then continue in for loop
                         break
                 if not self.isOnBoard(x, y):
                     continue
-                if self.board[x][y] == self.curr_player:
+                if cells[square_index(x, y)] == me:
                     # There are pieces to flip over. Go in the reverse direction until we reach the original space, noting all the tiles along the way.
                     while True:
                         x -= xdirection
@@ -60,42 +218,141 @@ class GameState:
                             break
                         tilesToFlip.append([x, y])
 
-        self.board[xstart][ystart] = EM # restore the empty space
         if len(tilesToFlip) == 0: # If no tiles were flipped, this is not a valid move.
             return False
         return tilesToFlip
 
+    def _flips(self, start):
+        """Returns the flat indices of the squares flipped by playing on the flat index start, or False if the move
+        is not valid.
+        """
+        cells = self.cells
+        if cells[start] != EM_CODE:
+            return False
+
+        me = CELL_CODES[self._curr_player]
+        op = CELL_CODES[OPPONENT_COLOR[self._curr_player]]
+        tilesToFlip = []
+        for ray in RAYS[start]:
+            if cells[ray[0]] != op:
+                continue
+            for i in range(1, len(ray)):
+                cell = cells[ray[i]]
+                if cell == op:
+                    continue
+                if cell == me:
+                    tilesToFlip.extend(ray[:i])
+                break
+
+        if len(tilesToFlip) == 0:
+            return False
+        return tilesToFlip
+
+    def get_moves_with_flips(self):
+        """Returns the valid moves together with the discs each of them flips.
+
+        :return: A list of ([x, y], flips) pairs in raster order. flips can be passed back to make_move or
+                 perform_move_with_flips to apply the move without scanning for flips again.
+        """
+        movesWithFlips = []
+
+        # A valid move must be next to a disc to flip, so only the frontier squares are tried.
+        for sq in sorted(self.frontier):
+            tilesToFlip = self._flips(sq)
+            if tilesToFlip != False:
+                movesWithFlips.append(([sq // BOARD_ROWS, sq % BOARD_ROWS], tilesToFlip))
+        return movesWithFlips
 
     def get_possible_moves(self):
-        validMoves = []
+        return [move for move, _ in self.get_moves_with_flips()]
 
-        for x in range(BOARD_COLS):
-            for y in range(BOARD_ROWS):
-                if self.isValidMove(x, y) != False:
-                    validMoves.append([x, y])
-        return validMoves
+    def has_moves(self):
+        """Returns whether the player to move has a valid move, stopping at the first one found."""
+        for sq in self.frontier:
+            if self._flips(sq) != False:
+                return True
+        return False
 
-    def perform_move(self, xstart, ystart):       
-        tilesToFlip = self.isValidMove(xstart, ystart)
-        if tilesToFlip == False:
-            return False
-        
-        self.board[xstart][ystart] = self.curr_player
-        for x, y in tilesToFlip:
-            self.board[x][y] = self.curr_player
-        # Updating the current player.
-        self.curr_player = OPPONENT_COLOR[self.curr_player]
+    def perform_move(self, xstart, ystart):
+        return self.make_move([xstart, ystart]) != False
+
+    def perform_move_with_flips(self, move, flips):
+        """Performs a move whose flips were returned by get_moves_with_flips, without validating it again."""
+        self.make_move(move, flips)
         return True
+
+    def make_move(self, move, flips=None):
+        """Performs a move in place and returns the record needed to take it back with unmake_move.
+
+        :param move: The [x, y] square to play.
+        :param flips: The move's flips as returned by get_moves_with_flips, or None to compute (and validate) them.
+        :return: An undo record (placed square, flipped squares, previous player, previous key, squares added to the
+                 frontier) with the squares given as flat indices, or False if the move is not valid.
+        """
+        xstart, ystart = move
+        if not self.isOnBoard(xstart, ystart):
+            return False
+        start = square_index(xstart, ystart)
+        if flips is None:
+            flips = self._flips(start)
+            if flips == False:
+                return False
+
+        cells = self.cells
+        prev_player = self._curr_player
+        prev_key = self.zobrist
+        me = CELL_CODES[prev_player]
+        cells[start] = me
+        key = prev_key ^ SQUARE_KEYS[prev_player][start] ^ SIDE_TO_MOVE_KEY
+        for sq in flips:
+            cells[sq] = me
+            key ^= FLIP_KEYS[sq]
+        self.zobrist = key
+        self._curr_player = OPPONENT_COLOR[prev_player]
+
+        counts = self.counts
+        counts[me] += 1 + len(flips)
+        counts[CELL_CODES[self._curr_player]] -= len(flips)
+        counts[EM_CODE] -= 1
+        frontier = self.frontier
+        frontier.discard(start)
+        added = [n for n in NEIGHBORS[start] if cells[n] == EM_CODE and n not in frontier]
+        frontier.update(added)
+        return start, flips, prev_player, prev_key, added
+
+    def unmake_move(self, undo):
+        """Takes back the move that returned the given undo record. Moves must be taken back in reverse order.
+
+        :param undo: The record returned by make_move.
+        """
+        start, flips, prev_player, prev_key, added = undo
+        cells = self.cells
+        op = CELL_CODES[OPPONENT_COLOR[prev_player]]
+        cells[start] = EM_CODE
+        for sq in flips:
+            cells[sq] = op
+        self._curr_player = prev_player
+        self.zobrist = prev_key
+
+        counts = self.counts
+        counts[CELL_CODES[prev_player]] -= 1 + len(flips)
+        counts[op] += len(flips)
+        counts[EM_CODE] += 1
+        # The played square was next to the discs it flipped, so it goes back to the frontier.
+        self.frontier.difference_update(added)
+        self.frontier.add(start)
     
+    def cell(self, x, y):
+        """Returns the piece on (x, y): EM, X_PLAYER or O_PLAYER."""
+        return CELL_VALUES[self.cells[x * BOARD_ROWS + y]]
+
+    def disc_count(self, player):
+        """Returns the number of discs the given player has on the board."""
+        return self.counts[CELL_CODES[player]]
+
     def get_winner(self):
-        my_u = 0
-        op_u = 0
-        for x in range(BOARD_COLS):
-            for y in range(BOARD_ROWS):
-                if self.board[x][y] == self.curr_player:
-                    my_u += 1
-                if self.board[x][y] == OPPONENT_COLOR[self.curr_player]:
-                    op_u += 1
+        my_u = self.disc_count(self.curr_player)
+        op_u = self.disc_count(OPPONENT_COLOR[self.curr_player])
         if my_u > op_u:
             return self.curr_player
         elif my_u < op_u:
@@ -125,10 +382,8 @@ class GameState:
         """This object can be inserted into a set or as dict key. NOTICE: Changing the object after it has been inserted
         into a set or dict (as key) may have unpredicted results!!!
         """
-        return   hash(','.join([self.board[i][j]
-                              for i in range(BOARD_ROWS)
-                              for j in range(BOARD_COLS)] + [self.curr_player]))
+        return self.zobrist
 
     def __eq__(self, other):
-        return isinstance(other, GameState) and self.board == other.board and self.curr_player == other.curr_player
+        return isinstance(other, GameState) and self.cells == other.cells and self.curr_player == other.curr_player
 
@@ -0,0 +1,39 @@
+"""Zobrist keys for hashing Reversi positions.
+
+A position's key is the XOR of one random 64-bit number per (square, disc color) on the board, plus
+SIDE_TO_MOVE_KEY when O is the player to move. Square (x, y) is number x * BOARD_ROWS + y in every table.
+"""
+import random
+from .consts import *
+
+# A fixed seed keeps the keys identical between runs and between processes.
+_rng = random.Random(0x5EED)
+
+SQUARE_KEYS = {
+    X_PLAYER: [_rng.getrandbits(64) for _ in range(BOARD_COLS * BOARD_ROWS)],
+    O_PLAYER: [_rng.getrandbits(64) for _ in range(BOARD_COLS * BOARD_ROWS)],
+}
+
+# Flipping a disc on a square always toggles both of its color keys.
+FLIP_KEYS = [x_key ^ o_key for x_key, o_key in zip(SQUARE_KEYS[X_PLAYER], SQUARE_KEYS[O_PLAYER])]
+
+SIDE_TO_MOVE_KEY = _rng.getrandbits(64)
+
+
+def side_key(player):
+    return SIDE_TO_MOVE_KEY if player == O_PLAYER else 0
+
+
+def board_key(board, curr_player):
+    """Computes the key of a position from scratch.
+
+    :param board: A board indexed as board[x][y].
+    :param curr_player: The player to move.
+    :return: The 64-bit Zobrist key.
+    """
+    key = side_key(curr_player)
+    for x in range(BOARD_COLS):
+        for y in range(BOARD_ROWS):
+            if board[x][y] != EM:
+                key ^= SQUARE_KEYS[board[x][y]][x * BOARD_ROWS + y]
+    return key
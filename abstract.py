@@ -28,6 +28,21 @@ Like this: 'class Player(abstract.AbstractPlayer):'
         """
         raise NotImplementedError
 
+    def start_pondering(self, game_state):
+        """Called by the runner after this player's move was performed, outside of the timed region.
+
+        A player may start thinking in the background while the opponent moves. This does nothing by default.
+
+        :param game_state: A copy of the board state after this player's move. The opponent is to move.
+        """
+        pass
+
+    def stop_pondering(self):
+        """Called by the runner before this player's next get_move and at the end of the game, outside of the
+        timed region. Must stop any background thinking started by start_pondering.
+        """
+        pass
+
     def __repr__(self):
         return self.color
 
@@ -0,0 +1,209 @@
+"""An exact endgame solver.
+
+Once few empty squares are left, the game can be searched to its end. The solver plays on raw bitboards (see
+Reversi.bitboard) and scores the final positions by disc differential. As in GameRunner, the game ends as soon as the
+player to move has no valid move.
+
+Move ordering follows the usual endgame practice: with many empties, fastest-first (the moves that leave the
+opponent the fewest replies first); with few empties, parity (the moves in regions of the board with an odd number
+of empties first). The last 1, 2 and 3 empties have their own routines without any ordering overhead.
+"""
+from Reversi.bitboard import BitboardGameState, moves_bits, flips_bits, pop_count, FULL_MASK
+from Reversi.consts import X_PLAYER, O_PLAYER, BOARD_COLS, BOARD_ROWS
+from utils import SearchAborted
+
+# The four 4x4 quadrants of the board, used as parity regions.
+QUADRANTS = []
+for _qx in range(0, BOARD_COLS, 4):
+    for _qy in range(0, BOARD_ROWS, 4):
+        _mask = 0
+        for _x in range(_qx, _qx + 4):
+            for _y in range(_qy, _qy + 4):
+                _mask |= 1 << (_x * BOARD_ROWS + _y)
+        QUADRANTS.append(_mask)
+
+# Below this many empties, fastest-first costs more than it saves and parity ordering alone is used.
+FASTEST_FIRST_EMPTIES = 7
+
+# no_more_time is called once every this many nodes.
+TIME_CHECK_INTERVAL = 1024
+
+
+def bits_list(bits):
+    """Returns the single bit masks of the set bits."""
+    result = []
+    while bits:
+        low = bits & -bits
+        result.append(low)
+        bits ^= low
+    return result
+
+
+def disc_difference(own, opp):
+    return pop_count(own) - pop_count(opp)
+
+
+class EndgameSolver:
+    def __init__(self, empties_threshold=10, exact=True, no_more_time=None):
+        """Initialize a solver.
+
+        :param empties_threshold: The solver applies to positions with at most this many empty squares.
+        :param exact: True to find the exact final disc differential, False to only find whether the player to move
+                      wins, loses or draws, which is faster.
+        :param no_more_time: An optional function that returns True once the solver must stop. It then raises
+                      utils.SearchAborted.
+        """
+        self.empties_threshold = empties_threshold
+        self.exact = exact
+        self.no_more_time = no_more_time
+        self.nodes = 0
+
+    def applies(self, state):
+        empties = BOARD_COLS * BOARD_ROWS - state.disc_count(X_PLAYER) - state.disc_count(O_PLAYER)
+        return empties <= self.empties_threshold
+
+    def solve(self, state):
+        """Solves a position.
+
+        :param state: Any game state.
+        :return: A tuple: (The score for the player to move, The best move or None if the game is over).
+                 In exact mode the score is the final disc differential. Otherwise it is only guaranteed to have the
+                 right sign: positive for a win, 0 for a draw and negative for a loss.
+        :raises SearchAborted: If no_more_time() fired.
+        """
+        bitboard = BitboardGameState.from_state(state)
+        own, opp = bitboard.own, bitboard.opp
+        self.nodes = 0
+        if self.exact:
+            alpha, beta = -BOARD_COLS * BOARD_ROWS - 1, BOARD_COLS * BOARD_ROWS + 1
+        else:
+            alpha, beta = -1, 1
+
+        moves = moves_bits(own, opp)
+        if not moves:
+            return disc_difference(own, opp), None
+        empties = ~(own | opp) & FULL_MASK
+        best_value = None
+        best_move_bit = None
+        for move_bit, flips in self._ordered_moves(own, opp, moves, empties):
+            value = -self._solve(opp & ~flips, own | flips | move_bit, -beta, -alpha, empties & ~move_bit)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_move_bit = move_bit
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        square = best_move_bit.bit_length() - 1
+        return best_value, [square // BOARD_ROWS, square % BOARD_ROWS]
+
+    def _tick(self):
+        self.nodes += 1
+        if self.no_more_time is not None and self.nodes % TIME_CHECK_INTERVAL == 0 and self.no_more_time():
+            raise SearchAborted
+
+    def _ordered_moves(self, own, opp, moves, empties):
+        """Returns the (move bit, flipped bits) pairs of the player owning 'own', best first."""
+        odd_regions = 0
+        for region in QUADRANTS:
+            if pop_count(empties & region) & 1:
+                odd_regions |= region
+
+        children = []
+        fastest_first = pop_count(empties) >= FASTEST_FIRST_EMPTIES
+        for move_bit in bits_list(moves):
+            flips = flips_bits(own, opp, move_bit)
+            score = 0 if move_bit & odd_regions else 1
+            if fastest_first:
+                score += 2 * pop_count(moves_bits(opp & ~flips, own | flips | move_bit))
+            children.append((score, move_bit, flips))
+        children.sort(key=lambda child: child[0])
+        return [(move_bit, flips) for _, move_bit, flips in children]
+
+    def _solve(self, own, opp, alpha, beta, empties):
+        """Negamax alpha-beta to the end of the game, from the point of view of the player owning 'own'."""
+        self._tick()
+        empty_count = pop_count(empties)
+        if empty_count <= 3:
+            return self._solve_small(own, opp, alpha, beta, empties, empty_count)
+
+        moves = moves_bits(own, opp)
+        if not moves:
+            return disc_difference(own, opp)
+
+        best_value = None
+        for move_bit, flips in self._ordered_moves(own, opp, moves, empties):
+            value = -self._solve(opp & ~flips, own | flips | move_bit, -beta, -alpha, empties & ~move_bit)
+            if best_value is None or value > best_value:
+                best_value = value
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+        return best_value
+
+    def _solve_small(self, own, opp, alpha, beta, empties, empty_count):
+        if empty_count == 3:
+            return self._solve_3(own, opp, alpha, beta, empties)
+        if empty_count == 2:
+            first = empties & -empties
+            return self._solve_2(own, opp, alpha, beta, first, empties ^ first)
+        if empty_count == 1:
+            return self._solve_1(own, opp, empties)
+        return disc_difference(own, opp)
+
+    def _solve_3(self, own, opp, alpha, beta, empties):
+        # Parity: with three empties, an empty alone in its region is the natural first move.
+        squares = bits_list(empties)
+        squares.sort(key=lambda square: 0 if pop_count(empties & _region_of(square)) & 1 else 1)
+        best_value = None
+        for index, square in enumerate(squares):
+            flips = flips_bits(own, opp, square)
+            if not flips:
+                continue
+            self._tick()
+            rest = squares[:index] + squares[index + 1:]
+            value = -self._solve_2(opp & ~flips, own | flips | square, -beta, -alpha, rest[0], rest[1])
+            if best_value is None or value > best_value:
+                best_value = value
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+        if best_value is None:
+            return disc_difference(own, opp)
+        return best_value
+
+    def _solve_2(self, own, opp, alpha, beta, first, second):
+        best_value = None
+        for square, other in ((first, second), (second, first)):
+            flips = flips_bits(own, opp, square)
+            if not flips:
+                continue
+            self._tick()
+            value = -self._solve_1(opp & ~flips, own | flips | square, other)
+            if best_value is None or value > best_value:
+                best_value = value
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+        if best_value is None:
+            return disc_difference(own, opp)
+        return best_value
+
+    @staticmethod
+    def _solve_1(own, opp, square):
+        flips = flips_bits(own, opp, square)
+        if not flips:
+            # The player to move is stuck, so the game ends here.
+            return disc_difference(own, opp)
+        return disc_difference(own, opp) + 1 + 2 * pop_count(flips)
+
+
+def _region_of(square):
+    for region in QUADRANTS:
+        if square & region:
+            return region
+    return 0
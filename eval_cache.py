@@ -0,0 +1,63 @@
+"""A bounded cache of position evaluations.
+
+Iterative deepening evaluates the same leaves at every depth, and transpositions reach them again within a depth.
+EvaluationCache wraps a utility function and remembers its values by the position's Zobrist key, which includes the
+side to move. The least recently used entries are evicted once the memory budget is reached. The cache is meant to be
+kept for the whole game, like the transposition table: the leaves of one move's search are often searched again by
+the next one.
+"""
+from collections import OrderedDict
+
+# A rough size of one cached entry (the ordered dict's slot and link, the key and the value), used to turn a memory
+# budget into a number of entries.
+ENTRY_BYTES = 160
+
+
+class EvaluationCache:
+    def __init__(self, utility, max_megabytes=8):
+        """Initialize an empty cache.
+
+        :param utility: The utility function to cache. It gets a state and returns its value for one fixed player.
+        :param max_megabytes: The approximate memory budget of the cache, in megabytes.
+        """
+        self.utility = utility
+        self.max_megabytes = max_megabytes
+        self.size = max(1, int(max_megabytes * 1024 * 1024) // ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, state):
+        """Returns the utility of a state, evaluating it only if it is not cached.
+
+        :param state: A game state with a zobrist attribute.
+        """
+        key = state.zobrist
+        entries = self.entries
+        try:
+            value = entries[key]
+        except KeyError:
+            self.misses += 1
+            value = entries[key] = self.utility(state)
+            if len(entries) > self.size:
+                entries.popitem(last=False)
+            return value
+        self.hits += 1
+        entries.move_to_end(key)
+        return value
+
+    def report(self):
+        """Returns the counters since the last reset_stats as a dict, with the hit rate and the number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            'eval_cache_hits': self.hits,
+            'eval_cache_misses': self.misses,
+            'eval_cache_hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'eval_cache_entries': len(self.entries),
+        }
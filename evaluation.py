@@ -0,0 +1,107 @@
+"""The evaluation shared by the search players.
+
+The utility weighs four features, each an advantage of the evaluated color over its opponent: the discs, the corners,
+the discs next to empty corners (a liability) and the mobility. They are all computed from one pair of bitboards:
+the bitboard backend already holds them, and the mailbox backend's cells are read once to build them. The mobility
+is counted from the bitboards as well, so the state is neither copied nor changed.
+"""
+from Reversi.bitboard import BitboardGameState, moves_bits, pop_count, square_bit
+from Reversi.board import CELL_CODES
+from Reversi.consts import X_PLAYER, O_PLAYER
+from move_ordering import CORNERS, CORNER_NEIGHBORS
+from utils import INFINITY
+
+X_CODE = CELL_CODES[X_PLAYER]
+O_CODE = CELL_CODES[O_PLAYER]
+
+CORNER_BITS = 0
+for _corner in CORNERS:
+    CORNER_BITS |= square_bit(*_corner)
+
+# (corner bit, the bits of its X- and C-squares) pairs.
+CORNER_NEIGHBOR_BITS = []
+for _corner in CORNERS:
+    _neighbors = 0
+    for _square, _square_corner in CORNER_NEIGHBORS.items():
+        if _square_corner == _corner:
+            _neighbors |= square_bit(*_square)
+    CORNER_NEIGHBOR_BITS.append((square_bit(*_corner), _neighbors))
+
+COIN_WEIGHT = 0.50
+CORNER_WEIGHT = 0.30
+CORNER_CLOSENESS_WEIGHT = 0.15
+MOBILITY_WEIGHT = 0.05
+
+
+def player_bits(state, color):
+    """Returns the bitboards of a color's discs and of its opponent's discs.
+
+    :param state: A game state of any backend.
+    :param color: The color whose discs come first.
+    """
+    if isinstance(state, BitboardGameState):
+        if state.curr_player == color:
+            return state.own, state.opp
+        return state.opp, state.own
+    x_bits = o_bits = 0
+    for square, code in enumerate(state.cells):
+        if code == X_CODE:
+            x_bits |= 1 << square
+        elif code == O_CODE:
+            o_bits |= 1 << square
+    if color == X_PLAYER:
+        return x_bits, o_bits
+    return o_bits, x_bits
+
+
+def advantage(mine, theirs):
+    """Returns the share of the larger count in percent, positive if it is mine and negative if it is theirs."""
+    if mine > theirs:
+        return (100.0 * mine) / (mine + theirs)
+    elif mine < theirs:
+        return -(100.0 * theirs) / (mine + theirs)
+    return 0
+
+
+def utility(state, color):
+    """Evaluates a state for a color.
+
+    :param state: A game state of any backend.
+    :param color: The color to evaluate for.
+    :return: The weighted sum of the features, or +-INFINITY if one side has no moves or no discs.
+    """
+    return bits_utility(*player_bits(state, color))
+
+
+def bits_utility(mine, theirs):
+    """utility of the position with the given bitboards of the evaluated color and of its opponent."""
+    my_moves = pop_count(moves_bits(mine, theirs))
+    if my_moves == 0:
+        return -INFINITY
+    op_moves = pop_count(moves_bits(theirs, mine))
+    if op_moves == 0:
+        return INFINITY
+    mobility_adv = advantage(my_moves, op_moves)
+
+    my_coins = pop_count(mine)
+    op_coins = pop_count(theirs)
+    if my_coins == 0:
+        # I have no tools left
+        return -INFINITY
+    elif op_coins == 0:
+        # The opponent has no tools left
+        return INFINITY
+    coin_adv = advantage(my_coins, op_coins)
+
+    corner_adv = 25 * (pop_count(mine & CORNER_BITS) - pop_count(theirs & CORNER_BITS))
+
+    empties = ~(mine | theirs)
+    my_close = op_close = 0
+    for corner_bit, neighbor_bits in CORNER_NEIGHBOR_BITS:
+        if empties & corner_bit:
+            my_close += pop_count(mine & neighbor_bits)
+            op_close += pop_count(theirs & neighbor_bits)
+    corner_closeness_adv = -8.333 * (my_close - op_close)
+
+    return (COIN_WEIGHT * coin_adv) + (CORNER_WEIGHT * corner_adv) + \
+        (CORNER_CLOSENESS_WEIGHT * corner_closeness_adv) + (MOBILITY_WEIGHT * mobility_adv)
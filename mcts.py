@@ -0,0 +1,198 @@
+"""Monte Carlo Tree Search.
+
+Instead of searching to a fixed depth with a utility function, MCTS grows a tree towards the promising moves and
+values its nodes by the results of playouts: games played to their end from the node. The selection uses UCT (the UCB1
+formula applied to trees). The tree is kept between moves, so the part of it below the moves actually played is
+reused. Its strength grows with the time and memory it is given, not with a depth.
+"""
+import math
+import random
+import time
+from endgame import bits_list
+from evaluation import CORNER_BITS, CORNER_NEIGHBOR_BITS
+from Reversi.bitboard import BitboardGameState, moves_bits, flips_bits, pop_count
+from Reversi.consts import TIE, OPPONENT_COLOR
+
+DEFAULT_EXPLORATION = math.sqrt(2)
+
+# A rough size of one tree node with its lists, used to turn a memory cap into a number of nodes.
+NODE_BYTES = 400
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'children', 'untried', 'player', 'key', 'visits', 'wins')
+
+    def __init__(self, move, parent, untried, player, key):
+        """A tree node.
+
+        :param move: The move leading to this node, or None for the root.
+        :param parent: The parent node, or None for the root.
+        :param untried: The (move, flips) pairs of the node's state that have no child node yet.
+        :param player: The player who made 'move', from whose point of view 'wins' is counted.
+        :param key: The Zobrist key of the node's state, used to find it again when the tree is reused.
+        """
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.player = player
+        self.key = key
+        self.visits = 0
+        self.wins = 0.0
+
+
+class MonteCarloTreeSearch:
+    def __init__(self, no_more_time, exploration=DEFAULT_EXPLORATION, heuristic_playouts=False, max_megabytes=64):
+        """Initialize a search with an empty tree.
+
+        :param no_more_time: A function that returns True once the search must stop.
+        :param exploration: The UCT exploration constant. Higher values spread the visits over more moves.
+        :param heuristic_playouts: True to play corners and avoid the squares next to empty corners in the playouts,
+                        False for uniformly random playouts.
+        :param max_megabytes: The approximate memory cap of the tree. Once it is reached the tree stops growing, and
+                        the remaining iterations only add playouts to the existing nodes.
+        """
+        self.no_more_time = no_more_time
+        self.exploration = exploration
+        self.heuristic_playouts = heuristic_playouts
+        self.max_nodes = max(1, int(max_megabytes * 1024 * 1024) // NODE_BYTES)
+        self.root = None
+        self.node_count = 0
+        self.iterations = 0
+        self.visits_per_second = 0.0
+
+    def search(self, state, possible_moves):
+        """Runs iterations until no_more_time() fires.
+
+        :param state: The state to search from. It is restored before returning.
+        :param possible_moves: The moves of the state.
+        :return: The most visited move.
+        """
+        start = time.time()
+        self.root = self.reuse_tree(state)
+        self.iterations = 0
+        while True:
+            self.iterate(state)
+            self.iterations += 1
+            if self.no_more_time():
+                break
+        elapsed = time.time() - start
+        self.visits_per_second = self.iterations / elapsed if elapsed > 0 else 0.0
+
+        if not self.root.children:
+            return possible_moves[0]
+        best = max(self.root.children, key=lambda child: child.visits)
+        return best.move
+
+    def reuse_tree(self, state):
+        """Returns the node of the previous tree that matches the state, or a new root.
+
+        The previous root was the position before our last move, so the state is searched for among its
+        grandchildren: our move followed by the opponent's.
+        """
+        if self.root is not None:
+            for child in self.root.children:
+                for grandchild in child.children:
+                    if grandchild.key == state.zobrist:
+                        grandchild.parent = None
+                        grandchild.move = None
+                        self.node_count = self.count_nodes(grandchild)
+                        return grandchild
+        self.node_count = 1
+        return Node(None, None, state.get_moves_with_flips(), OPPONENT_COLOR[state.curr_player], state.zobrist)
+
+    @staticmethod
+    def count_nodes(root):
+        count = 0
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+    def iterate(self, state):
+        """Runs one selection, expansion, playout and backpropagation, restoring the state afterwards."""
+        undo_stack = []
+        node = self.root
+
+        # Selection: descend through fully expanded nodes.
+        while not node.untried and node.children:
+            node = self.select_child(node)
+            undo_stack.append(state.make_move(node.move))
+
+        # Expansion: add one child for an untried move.
+        if node.untried and self.node_count < self.max_nodes:
+            move, flips = node.untried.pop(random.randrange(len(node.untried)))
+            player = state.curr_player
+            undo_stack.append(state.make_move(move, flips))
+            child = Node(move, node, state.get_moves_with_flips(), player, state.zobrist)
+            node.children.append(child)
+            node = child
+            self.node_count += 1
+
+        winner = self.playout(state)
+        for undo in reversed(undo_stack):
+            state.unmake_move(undo)
+
+        # Backpropagation.
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1.0
+            elif winner == TIE:
+                node.wins += 0.5
+            node = node.parent
+
+    def select_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best_score = None
+        best_child = None
+        for child in node.children:
+            score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_child = child
+        return best_child
+
+    def playout(self, state):
+        """Plays the game to its end on raw bitboards, picking the moves at random.
+
+        :return: The winner, or TIE.
+        """
+        bitboard = BitboardGameState.from_state(state)
+        own, opp = bitboard.own, bitboard.opp
+        player = state.curr_player
+        heuristic = self.heuristic_playouts
+        while True:
+            moves = moves_bits(own, opp)
+            if not moves:
+                break
+            if heuristic:
+                moves = self.playout_moves(own, opp, moves)
+            candidates = bits_list(moves)
+            move_bit = candidates[random.randrange(len(candidates))]
+            flips = flips_bits(own, opp, move_bit)
+            own, opp = opp & ~flips, own | flips | move_bit
+            player = OPPONENT_COLOR[player]
+
+        difference = pop_count(own) - pop_count(opp)
+        if difference > 0:
+            return player
+        if difference < 0:
+            return OPPONENT_COLOR[player]
+        return TIE
+
+    @staticmethod
+    def playout_moves(own, opp, moves):
+        """Narrows the moves down to the corners if there are any, otherwise to the moves that do not give an empty
+        corner away. Returns all the moves if there are no such moves."""
+        if moves & CORNER_BITS:
+            return moves & CORNER_BITS
+        empties = ~(own | opp)
+        unsafe = 0
+        for corner_bit, neighbor_bits in CORNER_NEIGHBOR_BITS:
+            if empties & corner_bit:
+                unsafe |= neighbor_bits
+        return moves & ~unsafe or moves
@@ -0,0 +1,89 @@
+"""Move ordering for the game tree searches.
+
+Alpha-beta prunes the most when the best move is searched first. MoveOrderer sorts the children of a node by:
+the hash move (the best move of a previous search of the node), corners, the killer moves of the ply, the history
+heuristic, and last the X- and C-squares next to an empty corner, which usually give that corner away.
+"""
+from Reversi.consts import EM, BOARD_COLS, BOARD_ROWS
+
+CORNERS = [(0, 0), (0, BOARD_ROWS - 1), (BOARD_COLS - 1, 0), (BOARD_COLS - 1, BOARD_ROWS - 1)]
+
+# Maps the X- and C-squares to the corner they are next to.
+CORNER_NEIGHBORS = {}
+for _cx, _cy in CORNERS:
+    for _dx in (-1, 0, 1):
+        for _dy in (-1, 0, 1):
+            _x, _y = _cx + _dx, _cy + _dy
+            if (_dx or _dy) and 0 <= _x < BOARD_COLS and 0 <= _y < BOARD_ROWS:
+                CORNER_NEIGHBORS[(_x, _y)] = (_cx, _cy)
+
+HASH_MOVE_SCORE = 1 << 30
+CORNER_SCORE = 1 << 28
+KILLER_SCORES = (1 << 26, 1 << 25)
+CORNER_NEIGHBOR_SCORE = -(1 << 28)
+
+# History scores are capped below the killer scores, so that they only order the remaining moves.
+MAX_HISTORY = (1 << 24) - 1
+
+
+class MoveOrderer:
+    def __init__(self, killers_per_ply=2):
+        """Initialize an orderer with no killers and an empty history.
+
+        :param killers_per_ply: How many killer moves to remember for every ply.
+        """
+        self.killers_per_ply = killers_per_ply
+        self.killers = []
+        self.history = [[0] * BOARD_ROWS for _ in range(BOARD_COLS)]
+
+    def new_search(self):
+        """Prepares for a search from a new root: the killers are dropped and the history is aged."""
+        self.killers = []
+        for column in self.history:
+            for y in range(BOARD_ROWS):
+                column[y] //= 2
+
+    def order(self, state, children, ply, hash_move=None):
+        """Sorts the children of a node, best first. Equally scored moves keep their order.
+
+        :param state: The node's state.
+        :param children: A list of (move, flips) pairs, as returned by get_moves_with_flips.
+        :param ply: The distance of the node from the root.
+        :param hash_move: The best move of a previous search of this node, or None.
+        :return: The sorted list.
+        """
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+
+        def score(child):
+            move = child[0]
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            x, y = move
+            if (x, y) in CORNERS:
+                return CORNER_SCORE
+            if move in killers:
+                return KILLER_SCORES[killers.index(move)]
+            corner = CORNER_NEIGHBORS.get((x, y))
+            if corner is not None and state.cell(corner[0], corner[1]) == EM:
+                return CORNER_NEIGHBOR_SCORE + history[x][y]
+            return history[x][y]
+
+        return sorted(children, key=score, reverse=True)
+
+    def record_cutoff(self, move, ply, depth):
+        """Remembers a move that caused a beta cutoff.
+
+        :param move: The move.
+        :param ply: The distance of the node from the root.
+        :param depth: The remaining depth of the node. Deeper cutoffs weigh more in the history.
+        """
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killers_per_ply:]
+
+        x, y = move
+        self.history[x][y] = min(MAX_HISTORY, self.history[x][y] + depth * depth)
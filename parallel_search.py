@@ -0,0 +1,154 @@
+"""Root-parallel alpha-beta search on a pool of worker processes.
+
+Python threads share one interpreter lock, so searching on several cores needs processes. The root moves are split
+between the workers, and every worker runs iterative deepening over its own moves until the deadline. The parent then
+picks the best move of the deepest iteration that all the workers completed.
+
+The workers are started once and kept alive between moves, together with their transposition tables and move
+orderers, so neither the process startup nor the table warmup is paid on every turn. The workers report every depth
+they complete as they go, so a search cut short by the deadline still uses the depths completed so far.
+"""
+import atexit
+import multiprocessing
+import queue
+import time
+from utils import INFINITY, SearchAborted, MiniMaxWithAlphaBetaPruning, BOARD_SQUARES
+from transposition import TranspositionTable
+from move_ordering import MoveOrderer
+from Reversi.consts import X_PLAYER, O_PLAYER
+
+# The workers stop this many seconds before the deadline, which leaves the parent the time to collect their results.
+RESULT_MARGIN = 0.03
+
+# The per-process search objects, built by _init_worker.
+_worker = {}
+
+
+def _init_worker(utility_factory, color, table_megabytes, selective_deepening, probcut, search_id, results):
+    _worker['utility'] = utility_factory(color)
+    _worker['color'] = color
+    _worker['table'] = TranspositionTable(max_megabytes=table_megabytes)
+    _worker['orderer'] = MoveOrderer()
+    _worker['selective_deepening'] = selective_deepening
+    _worker['probcut'] = probcut
+    _worker['search_id'] = search_id
+    _worker['results'] = results
+
+
+def _search_moves(args):
+    """Runs iterative deepening over some of the root moves until the deadline, or until the parent starts another
+    search. Puts a (search id, chunk index, depth, (value, move)) tuple on the results queue for every completed depth,
+    and (search id, chunk index, None, None) once it stops.
+
+    :param args: A tuple: (The search id, The chunk index, The root state, The root moves to search, The deadline as
+                 a time.time() value, The deepest iteration to run).
+    """
+    search, chunk, state, moves, deadline, max_depth = args
+    current_id = _worker['search_id']
+    results = _worker['results']
+    try:
+        if current_id.value != search:
+            return
+        orderer = _worker['orderer']
+        orderer.new_search()
+        _worker['table'].new_search()
+        engine = MiniMaxWithAlphaBetaPruning(
+            _worker['utility'], _worker['color'], lambda: time.time() >= deadline or current_id.value != search,
+            _worker['selective_deepening'], _worker['table'], orderer, _worker['probcut'])
+        for depth in range(1, max_depth + 1):
+            best = None
+            try:
+                for move in moves:
+                    undo = state.make_move(move)
+                    try:
+                        value, _ = engine.search(state, depth - 1, best[0] if best else -INFINITY, INFINITY, False)
+                    finally:
+                        state.unmake_move(undo)
+                    if best is None or value > best[0]:
+                        best = (value, move)
+            except SearchAborted:
+                break
+            results.put((search, chunk, depth, best))
+            # The next iteration starts with the best move of this one, which tightens the window early.
+            moves = [best[1]] + [move for move in moves if move != best[1]]
+    finally:
+        results.put((search, chunk, None, None))
+
+
+class ParallelRootSearch:
+    def __init__(self, utility_factory, my_color, selective_deepening, workers=None, table_megabytes=16,
+                 probcut=None):
+        """Start the worker processes.
+
+        :param utility_factory: A picklable callable (e.g. a module level function) that gets a color and returns
+                        the utility function for that color. Every worker calls it once at startup.
+        :param my_color: The color of the player who runs this search.
+        :param selective_deepening: The picklable selective deepening criterion of the workers' searches.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        :param table_megabytes: The memory cap of each worker's transposition table.
+        :param probcut: An optional probcut.ProbCut for the workers' searches.
+        """
+        self.my_color = my_color
+        self.workers = workers or multiprocessing.cpu_count()
+        # The id of the current search, written by this process only. The tasks of earlier searches see it change and
+        # stop, so a search that timed out leaves no work behind for the next one.
+        self.search_id = multiprocessing.RawValue('i', 0)
+        self.results = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                         initargs=(utility_factory, my_color, table_megabytes, selective_deepening,
+                                                   probcut, self.search_id, self.results))
+        # A pool left to the interpreter shutdown fails to stop cleanly.
+        atexit.register(self.close)
+        self.completed_depth = 0
+        self.best_value = None
+
+    def search(self, state, possible_moves, time_limit):
+        """Searches the root moves in parallel.
+
+        :param state: The state to search from. Its player to move must be my_color.
+        :param possible_moves: The moves of the state.
+        :param time_limit: The seconds the search may take.
+        :return: The best move of the deepest iteration all the workers completed, or the first possible move if
+                 there is none.
+        """
+        deadline = time.time() + time_limit
+        empties = BOARD_SQUARES - state.disc_count(X_PLAYER) - state.disc_count(O_PLAYER)
+        chunks = [possible_moves[index::self.workers] for index in range(min(self.workers, len(possible_moves)))]
+        self.search_id.value += 1
+        search = self.search_id.value
+        self.pool.map_async(_search_moves, [(search, index, state, chunk, deadline - RESULT_MARGIN, empties)
+                                            for index, chunk in enumerate(chunks)])
+
+        # Maps every chunk index to a dict of its completed depths' (value, move).
+        completed = dict((index, {}) for index in range(len(chunks)))
+        running = set(completed)
+        while running:
+            try:
+                result = self.results.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            result_search, index, depth, best = result
+            if result_search != search:
+                continue
+            if depth is None:
+                running.discard(index)
+            else:
+                completed[index][depth] = best
+        # Stops the tasks that are still running or queued.
+        self.search_id.value += 1
+
+        self.completed_depth = 0
+        self.best_value = None
+        common_depths = set.intersection(*[set(depths) for depths in completed.values()])
+        if not common_depths:
+            return possible_moves[0]
+        depth = max(common_depths)
+        value, move = max((depths[depth] for depths in completed.values()), key=lambda best: best[0])
+        self.completed_depth = depth
+        self.best_value = value
+        return move
+
+    def close(self):
+        """Stops the worker processes."""
+        self.pool.terminate()
+        self.pool.join()
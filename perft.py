@@ -0,0 +1,197 @@
+"""
+Move generation benchmark and correctness harness.
+
+perft counts the leaf nodes of the game tree to a fixed depth. The counts are a fingerprint of the move generation,
+and the time it takes to get them measures its throughput. The cross check walks the same tree with the reference
+isValidMove move generation, applying the flips isValidMove finds, and compares every backend against it, move by
+move.
+"""
+from __future__ import print_function
+import argparse
+import os
+import sys
+import time
+from Reversi.board import GameState, square_index
+from Reversi.backends import BACKENDS, DEFAULT_BACKEND, get_backend
+from Reversi.consts import BOARD_COLS, BOARD_ROWS, OPPONENT_COLOR
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '70_book.gam')
+
+
+def book_move_to_square(book_move):
+    """Translates an opening book move such as 'd3' to our [x, y] coordinates."""
+    return [BOARD_ROWS - int(book_move[1]), ord(book_move[0]) - ord('a')]
+
+
+def book_positions(count, book_file=BOOK_FILE):
+    """Builds positions by replaying the first lines of the opening book.
+
+    :param count: The number of book lines to replay.
+    :param book_file: The opening book file, one game prefix such as '+d3-c3+c4' per line.
+    :return: A list of (name, GameState) pairs.
+    """
+    positions = []
+    with open(book_file) as book:
+        for line in book:
+            if len(positions) >= count:
+                break
+            line = line.strip()
+            state = GameState()
+            for index in range(0, len(line), 3):
+                move = book_move_to_square(line[index + 1:index + 3])
+                if not state.perform_move(move[0], move[1]):
+                    raise ValueError('Illegal move {} in book line {}'.format(line[index:index + 3], line))
+            positions.append((line, state))
+    return positions
+
+
+def perft(state, depth, passes=False):
+    """Counts the leaf nodes of the game tree below the given state.
+
+    The runner ends the game as soon as the player to move has no moves, so by default such a position is a leaf.
+    With passes the standard Othello rules are used instead: the player without moves passes, and the game only ends
+    when neither player can move. A pass counts as a ply. Positions where the game ends early count as leaves.
+
+    :param state: The state to start from. It is restored before returning.
+    :param depth: The number of plies to expand.
+    :param passes: Whether to play by the standard pass rules.
+    :return: The number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+
+    children = state.get_moves_with_flips()
+    if not children:
+        if not passes:
+            return 1
+        state.curr_player = OPPONENT_COLOR[state.curr_player]
+        try:
+            if not state.has_moves():
+                return 1
+            return perft(state, depth - 1, passes)
+        finally:
+            state.curr_player = OPPONENT_COLOR[state.curr_player]
+
+    if depth == 1:
+        return len(children)
+
+    nodes = 0
+    for move, flips in children:
+        undo = state.make_move(move, flips)
+        nodes += perft(state, depth - 1, passes)
+        state.unmake_move(undo)
+    return nodes
+
+
+def reference_moves(state):
+    """Generates the moves of a list based state with the reference isValidMove, scanning every square."""
+    moves = []
+    for x in range(BOARD_COLS):
+        for y in range(BOARD_ROWS):
+            tilesToFlip = state.isValidMove(x, y)
+            if tilesToFlip != False:
+                moves.append(([x, y], tilesToFlip))
+    return moves
+
+
+def cross_check(state, depth, backend, passes=False):
+    """Compares a backend against the reference move generation on every node of the tree below state.
+
+    :param state: A GameState to start from.
+    :param depth: The number of plies to walk.
+    :param backend: The game state class to check.
+    :param passes: Whether to play by the standard pass rules, as in perft.
+    :return: A list of mismatch descriptions, empty if the backend agrees everywhere.
+    """
+    mismatches = []
+    _cross_check(GameState.from_state(state), backend.from_state(state), depth, passes, [], mismatches)
+    return mismatches
+
+
+def _cross_check(reference, candidate, depth, passes, path, mismatches):
+    if candidate.board != reference.board or candidate.curr_player != reference.curr_player:
+        mismatches.append('{}: positions differ'.format(path))
+        return
+    if candidate.zobrist != reference.zobrist:
+        mismatches.append('{}: Zobrist keys differ'.format(path))
+    if candidate.get_winner() != reference.get_winner():
+        mismatches.append('{}: winners differ'.format(path))
+
+    expected = reference_moves(reference)
+    moves = [move for move, _ in expected]
+    if candidate.get_possible_moves() != moves:
+        mismatches.append('{}: moves {} instead of {}'.format(path, candidate.get_possible_moves(), moves))
+        return
+    if candidate.has_moves() != bool(moves):
+        mismatches.append('{}: has_moves() is {} with moves {}'.format(path, candidate.has_moves(), moves))
+    if depth == 0:
+        return
+
+    if not moves:
+        if passes:
+            reference.curr_player = OPPONENT_COLOR[reference.curr_player]
+            candidate.curr_player = OPPONENT_COLOR[candidate.curr_player]
+            if reference_moves(reference):
+                _cross_check(reference, candidate, depth - 1, passes, path + ['pass'], mismatches)
+            reference.curr_player = OPPONENT_COLOR[reference.curr_player]
+            candidate.curr_player = OPPONENT_COLOR[candidate.curr_player]
+        return
+
+    for (move, tiles), (candidate_move, flips) in zip(expected, candidate.get_moves_with_flips()):
+        # The reference plays the flips of isValidMove, so that a bug in the table driven flips of either backend
+        # shows as a difference between the positions.
+        reference_undo = reference.make_move(move, [square_index(x, y) for x, y in tiles])
+        candidate_undo = candidate.make_move(candidate_move, flips)
+        _cross_check(reference, candidate, depth - 1, passes, path + [move], mismatches)
+        candidate.unmake_move(candidate_undo)
+        reference.unmake_move(reference_undo)
+        if candidate.board != reference.board or candidate.zobrist != reference.zobrist:
+            mismatches.append('{}: unmake_move did not restore the position'.format(path + [move]))
+            return
+
+
+def run(depth, backend_name=DEFAULT_BACKEND, passes=False, book_lines=0, check=False):
+    """Runs perft from the initial position and from book positions, printing counts and speed.
+
+    :return: True if no cross check mismatch was found.
+    """
+    backend = get_backend(backend_name)
+    positions = [('start', GameState())] + book_positions(book_lines)
+    total_nodes = 0
+    total_time = 0.0
+    ok = True
+    for name, position in positions:
+        state = backend.from_state(position)
+        start = time.time()
+        nodes = perft(state, depth, passes)
+        elapsed = time.time() - start
+        total_nodes += nodes
+        total_time += elapsed
+        print('{:<32} depth {} nodes {:>12} time {:8.3f}s {:>12.0f} nodes/s'.format(
+            name, depth, nodes, elapsed, nodes / elapsed if elapsed > 0 else float('inf')))
+        if check:
+            for mismatch in cross_check(position, depth, backend, passes):
+                ok = False
+                print('  MISMATCH {}'.format(mismatch))
+    print('{:<32} total nodes {:>12} time {:8.3f}s {:>12.0f} nodes/s'.format(
+        backend_name, total_nodes, total_time, total_nodes / total_time if total_time > 0 else float('inf')))
+    return ok
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Counts and times the leaf nodes of the game tree.')
+    parser.add_argument('depth', type=int, help='The number of plies to expand.')
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=sorted(BACKENDS),
+                        help='The game state implementation to measure.')
+    parser.add_argument('--passes', action='store_true',
+                        help='Use the standard pass rules instead of ending the game when the player to move is stuck.')
+    parser.add_argument('--book', type=int, default=0, metavar='N',
+                        help='Also run from the positions of the first N opening book lines.')
+    parser.add_argument('--check', action='store_true',
+                        help='Cross check the backend against the reference isValidMove move generation.')
+    args = parser.parse_args(argv)
+    return 0 if run(args.depth, args.backend, args.passes, args.book, args.check) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
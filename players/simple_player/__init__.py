@@ -4,9 +4,10 @@
 #===============================================================================
 
 import abstract
-from utils import INFINITY, run_with_limited_time, ExceededTimeError
-from Reversi.consts import EM, OPPONENT_COLOR, BOARD_COLS, BOARD_ROWS
-import time
+import batch_eval
+from utils import run_with_limited_time, ExceededTimeError
+from Reversi.consts import EM
+from time_manager import TimeManager
 import copy
 from collections import defaultdict
 
@@ -17,69 +18,36 @@ from collections import defaultdict
 class Player(abstract.AbstractPlayer):
     def __init__(self, setup_time, player_color, time_per_k_turns, k):
         abstract.AbstractPlayer.__init__(self, setup_time, player_color, time_per_k_turns, k)
-        self.clock = time.time()
 
-        # We are simply providing (remaining time / remaining turns) for each turn in round.
-        # Taking a spare time of 0.05 seconds.
-        self.turns_remaining_in_round = self.k
-        self.time_remaining_in_round = self.time_per_k_turns
-        self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
+        # Splits the time of every k turns between the moves, see time_manager.
+        self.time_manager = TimeManager(self.time_per_k_turns, self.k)
 
     def get_move(self, game_state, possible_moves):
-        self.clock = time.time()
-        self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
+        self.time_manager.start_move(game_state, len(possible_moves))
         if len(possible_moves) == 1:
+            self.time_manager.end_move()
             return possible_moves[0]
 
-        best_move = possible_moves[0]
-        next_state = copy.deepcopy(game_state)
-        next_state.perform_move(best_move[0],best_move[1])
-        # Choosing an arbitrary move
-        # Get the best move according the utility function
+        next_states = []
         for move in possible_moves:
             new_state = copy.deepcopy(game_state)
             new_state.perform_move(move[0],move[1])
-            if self.utility(new_state) > self.utility(next_state):
-                next_state = new_state
-                best_move = move
+            next_states.append(new_state)
+        # Get the best move according the utility function, all the moves evaluated in one batch. The first of the
+        # equally good moves is chosen.
+        values = batch_eval.disc_differences(next_states, self.color)
+        best_move = possible_moves[values.index(max(values))]
 
-        if self.turns_remaining_in_round == 1:
-            self.turns_remaining_in_round = self.k
-            self.time_remaining_in_round = self.time_per_k_turns
-        else:
-            self.turns_remaining_in_round -= 1
-            self.time_remaining_in_round -= (time.time() - self.clock)
+        self.time_manager.end_move()
 
         return best_move
 
-    def utility(self, state):
-        if len(state.get_possible_moves()) == 0:
-            return INFINITY if state.curr_player != self.color else -INFINITY
-
-        my_u = 0
-        op_u = 0
-        for x in range(BOARD_COLS):
-            for y in range(BOARD_ROWS):
-                if state.board[x][y] == self.color:
-                    my_u += 1
-                if state.board[x][y] == OPPONENT_COLOR[self.color]:
-                    op_u += 1
-
-        if my_u == 0:
-            # I have no tools left
-            return -INFINITY
-        elif op_u == 0:
-            # The opponent has no tools left
-            return INFINITY
-        else:
-            return my_u - op_u
-        
-    def selective_deepening_criterion(self, state):
+    def selective_deepening_criterion(self, state, children=None):
         # Simple player does not selectively deepen into certain nodes.
         return False
 
     def no_more_time(self):
-        return (time.time() - self.clock) >= self.time_for_current_move
+        return self.time_manager.no_more_time()
 
     def __repr__(self):
         return '{} {}'.format(abstract.AbstractPlayer.__repr__(self), 'simple')
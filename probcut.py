@@ -0,0 +1,230 @@
+"""
+Multi-ProbCut forward pruning, and the tool that calibrates it.
+
+The value of a deep search is well predicted by the value of a shallow search of the same node:
+v_deep = a * v_shallow + b + e, where the error e is roughly normal with a standard deviation sigma. Before searching a
+node deeply, ProbCut runs a cheap shallow null-window search that checks whether the predicted deep value is above
+beta (or below alpha) with a confidence of 'threshold' standard deviations, and cuts the node if so. Multi-ProbCut
+does this for several depth pairs.
+
+The a, b and sigma of every (deep, shallow) depth pair come from an offline calibration that runs both searches over a
+set of positions and fits a linear regression:
+
+    python probcut.py --positions 200 --pairs 3:1 4:2 5:3
+
+writes them to probcut.json, which the search players load at startup. Without the file, ProbCut is disabled.
+"""
+from __future__ import print_function
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import sys
+import time
+from utils import INFINITY, NULL_WINDOW, selective_deepening
+
+PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'probcut.json')
+
+DEFAULT_THRESHOLD = 1.5
+
+DEFAULT_PAIRS = ((3, 1), (4, 2), (5, 3))
+
+
+class ProbCut:
+    def __init__(self, checks, threshold=DEFAULT_THRESHOLD):
+        """Initialize with calibrated parameters.
+
+        :param checks: A dict mapping a deep depth to a list of (shallow depth, a, b, sigma) tuples, tried in order.
+        :param threshold: How many standard deviations the predicted value must be outside the window for a cut.
+                        Lower values cut more and err more.
+        """
+        self.checks = checks
+        self.threshold = threshold
+        # True while a shallow search runs, so that the shallow searches themselves are never cut.
+        self.probing = False
+        self.probes = 0
+        self.cuts = 0
+
+    @classmethod
+    def load(cls, path=PARAMS_FILE):
+        """Loads the parameters written by the calibration.
+
+        :return: A ProbCut, or None if there is no parameters file.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path) as params_file:
+            params = json.load(params_file)
+        checks = {}
+        for depth, pairs in params['checks'].items():
+            checks[int(depth)] = [tuple(pair) for pair in pairs]
+        return cls(checks, params.get('threshold', DEFAULT_THRESHOLD))
+
+    def save(self, path=PARAMS_FILE):
+        params = {
+            'threshold': self.threshold,
+            'checks': dict((str(depth), [list(pair) for pair in pairs]) for depth, pairs in self.checks.items()),
+        }
+        with open(path, 'w') as params_file:
+            json.dump(params, params_file, indent=2, sort_keys=True)
+
+    def try_cut(self, depth, alpha, beta, probe):
+        """Tries to cut a node before searching it.
+
+        All the values are from the point of view of the node's player to move.
+
+        :param depth: The depth the node is about to be searched to.
+        :param alpha: The alpha of the node's window.
+        :param beta: The beta of the node's window.
+        :param probe: A function (depth, alpha, beta) that searches the node with the given depth and window and
+                        returns its fail-soft value.
+        :return: beta or alpha if the deep search will very likely fail high or low, None otherwise.
+        """
+        if self.probing:
+            return None
+        checks = self.checks.get(depth)
+        if not checks:
+            return None
+        self.probing = True
+        try:
+            for shallow, a, b, sigma in checks:
+                margin = self.threshold * sigma
+                if beta < INFINITY:
+                    # a * v_shallow + b - margin >= beta, with v_shallow as the only unknown.
+                    bound = (beta + margin - b) / a
+                    self.probes += 1
+                    if probe(shallow, bound - NULL_WINDOW, bound) >= bound:
+                        self.cuts += 1
+                        return beta
+                if alpha > -INFINITY:
+                    bound = (alpha - margin - b) / a
+                    self.probes += 1
+                    if probe(shallow, bound, bound + NULL_WINDOW) <= bound:
+                        self.cuts += 1
+                        return alpha
+        finally:
+            self.probing = False
+        return None
+
+
+def fit(pairs):
+    """Fits v_deep = a * v_shallow + b by least squares.
+
+    :param pairs: A list of (v_shallow, v_deep) pairs.
+    :return: A tuple: (a, b, The standard deviation of the residuals).
+    """
+    count = len(pairs)
+    mean_x = sum(x for x, _ in pairs) / count
+    mean_y = sum(y for _, y in pairs) / count
+    var_x = sum((x - mean_x) ** 2 for x, _ in pairs)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in pairs)
+    a = cov / var_x if var_x > 0 else 1.0
+    b = mean_y - a * mean_x
+    sigma = math.sqrt(sum((y - a * x - b) ** 2 for x, y in pairs) / count)
+    return a, b, sigma
+
+
+def calibration_positions(count, seed=0):
+    """Builds positions from all phases of the game: opening book lines, taken in turn, continued with random moves.
+
+    :return: A list of at most count game states, none of them with the game over.
+    """
+    from perft import BOOK_FILE, book_positions
+    with open(BOOK_FILE) as book:
+        book_lines = sum(1 for _ in book)
+    openings = [state for _, state in book_positions(book_lines)]
+    rng = random.Random(seed)
+    positions = []
+    for index in range(count):
+        state = copy.deepcopy(openings[index % len(openings)])
+        for _ in range(rng.randint(0, 40)):
+            possible_moves = state.get_possible_moves()
+            if not possible_moves:
+                break
+            state.perform_move(*rng.choice(possible_moves))
+        if state.get_possible_moves():
+            positions.append(state)
+    return positions
+
+
+def calibrate(positions, pairs, utility_factory, criterion=selective_deepening):
+    """Runs the shallow and deep search of every depth pair on every position and fits their relation.
+
+    The searches are those of the player that loads the parameters: the same engine, with the same selective
+    deepening criterion and the quiescence search below its leaves, so the fitted relation is the one ProbCut meets
+    during play.
+
+    :param positions: The game states to search.
+    :param pairs: (deep depth, shallow depth) pairs.
+    :param utility_factory: A function that gets a color and returns the utility function for it.
+    :param criterion: The selective deepening criterion of the player.
+    :return: A checks dict for ProbCut.
+    """
+    from Reversi.backends import convert_state
+    from utils import MiniMaxWithAlphaBetaPruning
+    from move_ordering import MoveOrderer
+
+    utilities = {}
+    samples = dict((pair, []) for pair in pairs)
+    depths = sorted(set(depth for pair in pairs for depth in pair))
+    for index, position in enumerate(positions):
+        state = convert_state(position, 'bitboard')
+        color = state.curr_player
+        if color not in utilities:
+            utilities[color] = utility_factory(color)
+        # The values are from the point of view of the player to move, as ProbCut expects.
+        engine = MiniMaxWithAlphaBetaPruning(utilities[color], color, lambda: False, criterion,
+                                             move_orderer=MoveOrderer())
+        values = {}
+        for depth in depths:
+            values[depth], _ = engine.search(state, depth, -INFINITY, INFINITY, True)
+        for deep, shallow in pairs:
+            # Won and lost positions are scored +-INFINITY, which says nothing about the relation.
+            if abs(values[deep]) < INFINITY and abs(values[shallow]) < INFINITY:
+                samples[(deep, shallow)].append((values[shallow], values[deep]))
+        print('position {}/{} searched'.format(index + 1, len(positions)), file=sys.stderr)
+
+    checks = {}
+    for deep, shallow in pairs:
+        if len(samples[(deep, shallow)]) < 2:
+            continue
+        a, b, sigma = fit(samples[(deep, shallow)])
+        if a <= 0:
+            continue
+        checks.setdefault(deep, []).append((shallow, a, b, sigma))
+        print('deep {} shallow {}: a {:.4f} b {:.4f} sigma {:.4f} ({} samples)'.format(
+            deep, shallow, a, b, sigma, len(samples[(deep, shallow)])))
+    return checks
+
+
+def parse_pair(text):
+    deep, shallow = text.split(':')
+    if not 0 < int(shallow) < int(deep):
+        raise argparse.ArgumentTypeError('expected deep:shallow with deep > shallow > 0, got {}'.format(text))
+    return int(deep), int(shallow)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Calibrates the Multi-ProbCut parameters of the search players.')
+    parser.add_argument('--positions', type=int, default=200,
+                        help='The number of positions to calibrate on.')
+    parser.add_argument('--pairs', type=parse_pair, nargs='+', default=list(DEFAULT_PAIRS), metavar='DEEP:SHALLOW',
+                        help='The depth pairs to calibrate.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='The cut threshold, in standard deviations, saved with the parameters.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the random position continuations.')
+    parser.add_argument('--output', default=PARAMS_FILE, help='The parameters file to write.')
+    args = parser.parse_args(argv)
+
+    from players.alpha_beta_player import worker_utility
+    start = time.time()
+    checks = calibrate(calibration_positions(args.positions, args.seed), args.pairs, worker_utility)
+    ProbCut(checks, args.threshold).save(args.output)
+    print('wrote {} in {:.1f}s'.format(args.output, time.time() - start))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
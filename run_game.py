@@ -1,15 +1,19 @@
 """
 A generic turn-based game runner.
 """
+import csv
+import inspect
+import json
 import sys
-from Reversi.board import GameState
+from Reversi.backends import get_backend, DEFAULT_BACKEND
 from Reversi.consts import X_PLAYER, O_PLAYER, TIE, OPPONENT_COLOR
 import utils
 import copy
 import players.interactive
 
 class GameRunner:
-    def __init__(self, setup_time, time_per_k_turns, k, verbose, x_player, o_player):
+    def __init__(self, setup_time, time_per_k_turns, k, verbose, x_player, o_player, backend=DEFAULT_BACKEND,
+                 stats_file=None):
         """Game runner initialization.
 
         :param setup_time: Setup time allowed for each player in seconds.
@@ -18,8 +22,12 @@ class GameRunner:
         :param k: The k turns we measure time on. Must be a positive integer.
         :param verbose: preference of printing the board each turn. 'y' - yes, print. 'n' - no,  don't print.
         :param x_player: The name of the module containing the x player. E.g. "myplayer" will invoke an
-            equivalent to "import players.myplayer" in the code.
+            equivalent to "import players.myplayer" in the code. The name may be followed by keyword arguments for
+            the player's constructor, see parse_player_spec. E.g. "alpha_beta_player:parallel_workers=4".
         :param o_player: Same as 'x_player' parameter, but for the other player.
+        :param backend: The name of the game state implementation to play with, see Reversi.backends.
+        :param stats_file: An optional file to write the search report of every move to, as CSV if its name ends
+            with .csv and as JSON otherwise. See the players' last_search_report.
         """
 
         self.verbose = verbose.lower()
@@ -27,12 +35,20 @@ class GameRunner:
         self.time_per_k_turns = float(time_per_k_turns)
         self.k = int(k)
         self.players = {}
+        self.game_state_class = get_backend(backend)
+        self.stats_file = stats_file
+        self.move_reports = []
+        self.moves_played = 0
 
         # Dynamically importing the players. This allows maximum flexibility and modularity.
+        x_player, self.x_player_options = parse_player_spec(x_player)
+        o_player, self.o_player_options = parse_player_spec(o_player)
         self.x_player = 'players.{}'.format(x_player)
         self.o_player = 'players.{}'.format(o_player)
         __import__(self.x_player)
         __import__(self.o_player)
+        check_player_options(sys.modules[self.x_player].Player, self.x_player_options)
+        check_player_options(sys.modules[self.o_player].Player, self.o_player_options)
         x_is_interactive = sys.modules[self.x_player].Player == players.interactive.Player
         o_is_interactive = sys.modules[self.o_player].Player == players.interactive.Player
         
@@ -41,16 +57,18 @@ class GameRunner:
             O_PLAYER: utils.INFINITY if o_is_interactive else self.time_per_k_turns,
         }
 
-    def setup_player(self, player_class, player_type):
+    def setup_player(self, player_class, player_type, options=None):
         """ An auxiliary function to populate the players list, and measure setup times on the go.
 
         :param player_class: The player class that should be initialized, measured and put into the list.
         :param player_type: Player type, passed as an argument to the player.
+        :param options: Keyword arguments for the player class, from the player spec.
         :return: A boolean. True if the player exceeded the given time. False otherwise.
         """
         try:
             player, measured_time = utils.run_with_limited_time(
-                player_class, (self.setup_time, player_type, self.time_per_k_turns, self.k), {}, self.setup_time*1.5)
+                player_class, (self.setup_time, player_type, self.time_per_k_turns, self.k), options or {},
+                self.setup_time*1.5)
         except MemoryError:
             return True
 
@@ -62,13 +80,13 @@ class GameRunner:
         :return: The winner.
         """
         # Setup each player 
-        x_player_exceeded = self.setup_player(sys.modules[self.x_player].Player, X_PLAYER)
-        o_player_exceeded = self.setup_player(sys.modules[self.o_player].Player, O_PLAYER)
+        x_player_exceeded = self.setup_player(sys.modules[self.x_player].Player, X_PLAYER, self.x_player_options)
+        o_player_exceeded = self.setup_player(sys.modules[self.o_player].Player, O_PLAYER, self.o_player_options)
         winner = self.handle_time_expired(x_player_exceeded, o_player_exceeded)
         if winner: # One of the players exceeded the setup time
             return winner
 
-        board_state = GameState()
+        board_state = self.game_state_class()
         remaining_run_times = copy.deepcopy(self.player_move_times)
         k_count = 0
 
@@ -81,14 +99,18 @@ class GameRunner:
             player = self.players[board_state.curr_player]
             remaining_run_time = remaining_run_times[board_state.curr_player]
             try:
-                possible_moves = board_state.get_possible_moves()
+                moves_with_flips = board_state.get_moves_with_flips()
+                possible_moves = [possible_move for possible_move, _ in moves_with_flips]
                 if not possible_moves:
                     winner = self.make_winner_result(board_state.get_winner())
                     break
+                # Pondering stops before the timed region, so it is billed to no one.
+                player.stop_pondering()
                 # Get move from player
                 move, run_time = utils.run_with_limited_time(
                     player.get_move, (copy.deepcopy(board_state), possible_moves), {}, remaining_run_time*1.5) ###
                 
+                self.record_move_report(player, board_state.curr_player, move, run_time)
                 remaining_run_times[board_state.curr_player] -= run_time
                 if remaining_run_times[board_state.curr_player] < 0:
                     raise utils.ExceededTimeError
@@ -97,9 +119,16 @@ class GameRunner:
                 winner = self.make_winner_result(OPPONENT_COLOR[board_state.curr_player])
                 break
             
-            board_state.perform_move(move[0],move[1])
+            # Applying the flips found by the move generation, unless the player returned a move it didn't offer.
+            for possible_move, flips in moves_with_flips:
+                if possible_move == list(move):
+                    board_state.perform_move_with_flips(possible_move, flips)
+                    break
+            else:
+                board_state.perform_move(move[0],move[1])
             if self.verbose == 'y':
                 print('Player ' + repr(player) + ' performed the move: [' + str(move[0]) + ', ' + str(move[1]) + ']')
+            player.start_pondering(copy.deepcopy(board_state))
             
             
             if board_state.curr_player == X_PLAYER:
@@ -108,9 +137,37 @@ class GameRunner:
                     # K rounds completed. Resetting timers.
                     remaining_run_times = copy.deepcopy(self.player_move_times)
 
+        for player in self.players.values():
+            player.stop_pondering()
         self.end_game(winner)
+        if self.stats_file:
+            self.write_move_reports(self.stats_file)
         return winner
 
+    def record_move_report(self, player, color, move, run_time):
+        """Keeps the search report of a move, for players that provide one in last_search_report."""
+        self.moves_played += 1
+        report = getattr(player, 'last_search_report', None)
+        if not self.stats_file or report is None:
+            return
+        row = {'move_number': self.moves_played, 'player': repr(player), 'color': color,
+               'move': '{},{}'.format(move[0], move[1]), 'run_time': run_time}
+        row.update(report)
+        self.move_reports.append(row)
+
+    def write_move_reports(self, path):
+        if path.endswith('.csv'):
+            fields = ['move_number', 'player', 'color', 'move', 'run_time']
+            for row in self.move_reports:
+                fields.extend(sorted(field for field in row if field not in fields))
+            with open(path, 'w') as stats_file:
+                writer = csv.DictWriter(stats_file, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.move_reports)
+        else:
+            with open(path, 'w') as stats_file:
+                json.dump(self.move_reports, stats_file, indent=2, sort_keys=True)
+
     @staticmethod
     def end_game(winner):
         if winner == TIE:
@@ -139,11 +196,53 @@ class GameRunner:
         return winner
 
 
+def parse_player_spec(spec):
+    """Splits a player spec such as "alpha_beta_player:parallel_workers=4,ponder=true" into the player's module name
+    and the keyword arguments for its constructor. Integer, float and true/false values are converted, anything else
+    is passed as a string.
+
+    :param spec: The module name, optionally followed by a colon and comma separated name=value pairs.
+    :return: A tuple: (The module name, The dict of keyword arguments).
+    """
+    name, _, options = spec.partition(':')
+    kwargs = {}
+    for option in options.split(',') if options else []:
+        key, separator, value = option.partition('=')
+        if not separator or not key:
+            raise ValueError('Expected name=value in the options of player {}, got {}'.format(name, option))
+        kwargs[key] = parse_option_value(value)
+    return name, kwargs
+
+
+def check_player_options(player_class, options):
+    """Raises ValueError if the player class does not take the given keyword arguments. The players are set up in a
+    thread, where the TypeError would be lost.
+    """
+    try:
+        inspect.signature(player_class.__init__).bind(None, 0, X_PLAYER, 0, 1, **options)
+    except TypeError as e:
+        raise ValueError('Bad options {} for {}: {}'.format(options, player_class.__module__, e))
+
+
+def parse_option_value(value):
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
 if __name__ == '__main__':
     try:
      GameRunner(*sys.argv[1:]).run()
     except TypeError:
-        print("""Syntax: {0} setup_time time_per_k_turns k verbose x_player o_player
+        print("""Syntax: {0} setup_time time_per_k_turns k verbose x_player o_player [backend] [stats_file]
 For example: {0} 2 10 5 y interactive random_player
+A player may be followed by keyword arguments for its constructor, e.g. alpha_beta_player:parallel_workers=4
+backend is one of mailbox (default) or bitboard.
+stats_file, if given, gets the search report of every move, as CSV if it ends with .csv and as JSON otherwise.
 Please read the docs in the code for more info.""".
               format(sys.argv[0]))
\ No newline at end of file
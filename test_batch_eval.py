@@ -0,0 +1,101 @@
+"""Checks that the batch evaluation of batch_eval gives the values of the one position functions, on the pure Python
+path that runs without NumPy and on the vectorized path.
+
+    python -m unittest test_batch_eval
+
+The vectorized path needs NumPy; without it those tests are skipped.
+"""
+import copy
+import unittest
+import batch_eval
+import evaluation
+from Reversi.backends import convert_state
+from Reversi.consts import X_PLAYER, O_PLAYER, OPPONENT_COLOR
+from players.simple_player import Player as SimplePlayer
+from probcut import calibration_positions
+from utils import INFINITY
+
+
+def reference_disc_difference(state, color):
+    """The disc difference of a state for a color, computed from the state's own move generation and disc counts."""
+    if len(state.get_possible_moves()) == 0:
+        return INFINITY if state.curr_player != color else -INFINITY
+    my_u = state.disc_count(color)
+    op_u = state.disc_count(OPPONENT_COLOR[color])
+    if my_u == 0:
+        return -INFINITY
+    elif op_u == 0:
+        return INFINITY
+    return my_u - op_u
+
+
+def test_states():
+    """Positions from all phases of the game on both backends, some of them with the game over."""
+    positions = calibration_positions(40, seed=1)
+    for state in positions[:10]:
+        state = copy.deepcopy(state)
+        while state.get_possible_moves():
+            state.perform_move(*state.get_possible_moves()[0])
+        positions.append(state)
+    return positions + [convert_state(state, 'bitboard') for state in positions]
+
+
+class BatchEvaluationTest(unittest.TestCase):
+    def setUp(self):
+        # The pure Python path, whether NumPy is installed or not.
+        self.numpy = batch_eval.numpy
+        batch_eval.numpy = None
+        self.states = test_states()
+
+    def tearDown(self):
+        batch_eval.numpy = self.numpy
+
+    def test_utilities(self):
+        for color in (X_PLAYER, O_PLAYER):
+            self.assertEqual(batch_eval.utilities(self.states, color),
+                             [evaluation.utility(state, color) for state in self.states])
+
+    def test_disc_differences(self):
+        for color in (X_PLAYER, O_PLAYER):
+            self.assertEqual(batch_eval.disc_differences(self.states, color),
+                             [reference_disc_difference(state, color) for state in self.states])
+
+    def test_simple_player_move(self):
+        for state in self.states:
+            possible_moves = state.get_possible_moves()
+            if len(possible_moves) < 2:
+                continue
+            player = SimplePlayer(2, state.curr_player, 2, 5)
+            values = []
+            for move in possible_moves:
+                child = copy.deepcopy(state)
+                child.perform_move(*move)
+                values.append(reference_disc_difference(child, player.color))
+            move = player.get_move(copy.deepcopy(state), possible_moves)
+            self.assertEqual(move, possible_moves[values.index(max(values))])
+
+
+@unittest.skipIf(batch_eval.numpy is None, 'NumPy is not installed')
+class VectorizedEvaluationTest(unittest.TestCase):
+    def setUp(self):
+        # Every batch takes the vectorized path, however small.
+        self.min_batch = batch_eval.NUMPY_MIN_BATCH
+        batch_eval.NUMPY_MIN_BATCH = 1
+        self.states = test_states()
+
+    def tearDown(self):
+        batch_eval.NUMPY_MIN_BATCH = self.min_batch
+
+    def test_utilities(self):
+        for color in (X_PLAYER, O_PLAYER):
+            self.assertEqual(batch_eval.utilities(self.states, color),
+                             [evaluation.utility(state, color) for state in self.states])
+
+    def test_disc_differences(self):
+        for color in (X_PLAYER, O_PLAYER):
+            self.assertEqual(batch_eval.disc_differences(self.states, color),
+                             [reference_disc_difference(state, color) for state in self.states])
+
+
+if __name__ == '__main__':
+    unittest.main()
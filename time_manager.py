@@ -0,0 +1,134 @@
+"""Per-move time allocation for the players.
+
+The runner gives every player time_per_k_turns seconds for each k of its turns. TimeManager keeps track of that
+budget and splits it between the moves:
+
+* The time is allocated by game phase: the midgame, where the search matters most, gets more than the opening and
+  the endgame. Forced moves get none, and whatever a move does not use is banked for the next moves of the k turns.
+* Every move has a soft limit, the time it is expected to take, and a hard limit, the time it may never exceed.
+  Iterative deepening stops starting new depths after the soft limit, and stops early once the best move has been
+  stable for a few depths. The searches themselves are aborted at the hard limit.
+* no_more_time() is called by the searches at every node, but it only reads the clock every check_interval calls.
+"""
+import time
+from Reversi.consts import X_PLAYER, O_PLAYER, BOARD_COLS, BOARD_ROWS
+
+# no_more_time() reads the clock once every this many calls.
+DEFAULT_CHECK_INTERVAL = 64
+
+# The hard limit of a move is at most this many times its soft limit.
+HARD_LIMIT_FACTOR = 3.0
+
+# A move whose best move was the same for this many completed depths stops once half its soft limit has passed.
+STABLE_ITERATIONS = 3
+
+
+def phase_weight(empties):
+    """Returns the share of the time given to a move played with the given number of empty squares."""
+    if empties > 48:
+        # The opening, where the positions are still close to equal.
+        return 0.6
+    if empties > 16:
+        return 1.0
+    # The endgame, which the endgame solver handles for the most part.
+    return 0.7
+
+
+class TimeManager:
+    def __init__(self, time_per_k_turns, k, safety_margin=0.05, check_interval=DEFAULT_CHECK_INTERVAL):
+        """Initialize a manager at the start of the game.
+
+        :param time_per_k_turns: The seconds the runner allows for every k turns.
+        :param k: The k above.
+        :param safety_margin: The seconds kept in reserve for every move, for the overhead outside the search.
+        :param check_interval: no_more_time() reads the clock once every this many calls.
+        """
+        self.time_per_k_turns = time_per_k_turns
+        self.k = k
+        self.safety_margin = safety_margin
+        self.check_interval = check_interval
+        self.turns_remaining_in_round = k
+        self.time_remaining_in_round = time_per_k_turns
+        self.clock = time.time()
+        self.soft_limit = 0.0
+        self.hard_limit = 0.0
+        self.calls = 0
+        self.expired = False
+        self.last_best_move = None
+        self.stable_iterations = 0
+
+    def start_move(self, state, move_count):
+        """Starts the clock of a move and sets its soft and hard limits.
+
+        :param state: The state to move from.
+        :param move_count: The number of possible moves. A forced move gets no time.
+        :return: The soft limit, in seconds.
+        """
+        self.clock = time.time()
+        self.calls = 0
+        self.expired = False
+        self.last_best_move = None
+        self.stable_iterations = 0
+
+        turns = self.turns_remaining_in_round
+        available = max(0.0, self.time_remaining_in_round - self.safety_margin * turns)
+        if move_count <= 1:
+            self.soft_limit = self.hard_limit = 0.0
+            return self.soft_limit
+
+        # Our later moves in the round are played with two fewer empties each.
+        empties = BOARD_COLS * BOARD_ROWS - state.disc_count(X_PLAYER) - state.disc_count(O_PLAYER)
+        weights = [phase_weight(empties - 2 * turn) for turn in range(turns)]
+        self.soft_limit = available * weights[0] / sum(weights)
+        # Half of the time of the later moves may be borrowed, never more.
+        self.hard_limit = min(HARD_LIMIT_FACTOR * self.soft_limit, (available + self.soft_limit) / 2)
+        return self.soft_limit
+
+    def end_move(self):
+        """Charges the time of the move to the round, starting a new round after k turns."""
+        if self.turns_remaining_in_round == 1:
+            self.turns_remaining_in_round = self.k
+            self.time_remaining_in_round = self.time_per_k_turns
+        else:
+            self.turns_remaining_in_round -= 1
+            self.time_remaining_in_round -= self.elapsed()
+
+    def elapsed(self):
+        return time.time() - self.clock
+
+    def no_more_time(self):
+        """Returns True once the hard limit has passed. Only reads the clock once every check_interval calls."""
+        if self.expired:
+            return True
+        self.calls += 1
+        if self.calls % self.check_interval == 0 or self.calls == 1:
+            self.expired = self.elapsed() >= self.hard_limit
+        return self.expired
+
+    def time_remaining(self):
+        """Returns the seconds left until the hard limit."""
+        return self.hard_limit - self.elapsed()
+
+    def soft_limit_passed(self):
+        return self.elapsed() >= self.soft_limit
+
+    def fraction_expired(self, fraction):
+        """Returns True once the given fraction of the hard limit has passed."""
+        return self.elapsed() >= fraction * self.hard_limit
+
+    def stop_iterating(self, best_move):
+        """Called by iterative deepening after every completed depth.
+
+        :param best_move: The best move of the depth.
+        :return: True if no new depth should be started: the soft limit has passed, or the best move has been stable
+                 and half of the soft limit has passed.
+        """
+        if best_move == self.last_best_move:
+            self.stable_iterations += 1
+        else:
+            self.last_best_move = best_move
+            self.stable_iterations = 1
+        elapsed = self.elapsed()
+        if elapsed >= self.soft_limit:
+            return True
+        return self.stable_iterations >= STABLE_ITERATIONS and elapsed >= self.soft_limit / 2
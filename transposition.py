@@ -0,0 +1,127 @@
+"""A bounded transposition table for the game tree searches.
+"""
+
+# Bound types of a stored value.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# A rough size of one stored entry (the tuple, its key, value and move), used to turn a memory cap into a number
+# of slots.
+ENTRY_BYTES = 200
+
+
+class TranspositionTable:
+    def __init__(self, max_megabytes=32):
+        """Initialize an empty table.
+
+        Every bucket has two slots: a depth-preferred slot, which keeps the deepest search of the positions mapped to
+        it, and an always-replace slot, which keeps the most recent shallower search. The depth-preferred slot only
+        protects the entries of the current search generation, see new_search.
+
+        :param max_megabytes: The approximate memory cap of the table, in megabytes.
+        """
+        self.max_megabytes = max_megabytes
+        self.size = max(1, int(max_megabytes * 1024 * 1024) // (2 * ENTRY_BYTES))
+        self.clear()
+
+    def clear(self):
+        self.depth_slots = [None] * self.size
+        self.always_slots = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Starts a new search generation, called once per move.
+
+        Discs are never taken off the board, so the positions of earlier moves mostly cannot recur. Their entries are
+        still found by probes, but no longer keep a depth-preferred slot from the entries of the current move.
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """Looks up a position.
+
+        :param key: The position's Zobrist key.
+        :return: The stored entry (key, depth, bound type, value, best move, generation), or None.
+        """
+        self.probes += 1
+        index = key % self.size
+        entry = self.depth_slots[index]
+        if entry is None or entry[0] != key:
+            entry = self.always_slots[index]
+            if entry is None or entry[0] != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, bound, value, best_move):
+        """Stores the result of searching a position.
+
+        :param key: The position's Zobrist key.
+        :param depth: The depth the position was searched to.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param value: The search value.
+        :param best_move: The best move found, or None.
+        """
+        self.stores += 1
+        index = key % self.size
+        entry = (key, depth, bound, value, best_move, self.generation)
+        current = self.depth_slots[index]
+        if current is None or current[0] == key or current[5] != self.generation or depth >= current[1]:
+            self.depth_slots[index] = entry
+        else:
+            self.always_slots[index] = entry
+
+    def lookup(self, key, depth, alpha, beta):
+        """Probes a position and checks whether its stored value settles a search with the given depth and window.
+
+        :return: A tuple: (The entry or None, The value if the search can be skipped or None).
+        """
+        entry = self.probe(key)
+        if entry is None or entry[1] < depth:
+            return entry, None
+        value = entry[3]
+        if entry[2] == EXACT or (entry[2] == LOWER_BOUND and value >= beta) or \
+                (entry[2] == UPPER_BOUND and value <= alpha):
+            return entry, value
+        return entry, None
+
+    def principal_line(self, state, max_length):
+        """Follows the stored best moves from a position, the principal variation of the searches that stored them.
+
+        :param state: The position to start from. It is restored before returning.
+        :param max_length: The most entries to follow.
+        :return: The stored entries along the line, the position's own first.
+        """
+        entries = []
+        undos = []
+        try:
+            while len(entries) < max_length:
+                entry = self.probe(state.zobrist)
+                if entry is None:
+                    break
+                entries.append(entry)
+                undo = state.make_move(entry[4]) if entry[4] is not None else False
+                if undo is False:
+                    break
+                undos.append(undo)
+        finally:
+            for undo in reversed(undos):
+                state.unmake_move(undo)
+        return entries
+
+    def __len__(self):
+        return sum(1 for entry in self.depth_slots if entry is not None) + \
+            sum(1 for entry in self.always_slots if entry is not None)
+
+
+def bound_type(value, alpha, beta):
+    """Returns the bound type of a fail-soft search value found with the window (alpha, beta)."""
+    if value <= alpha:
+        return UPPER_BOUND
+    if value >= beta:
+        return LOWER_BOUND
+    return EXACT
@@ -4,11 +4,25 @@
 from threading import Thread
 from multiprocessing import Queue
 import time
-import copy
+from transposition import bound_type
+from move_ordering import CORNERS
+from Reversi.consts import X_PLAYER, O_PLAYER, BOARD_COLS, BOARD_ROWS
 
 
 INFINITY = float(6000)
 
+BOARD_SQUARES = BOARD_COLS * BOARD_ROWS
+
+# The width of the null window of Principal Variation Search. The utilities return floats, so the window is a tiny
+# interval rather than a single integer step.
+NULL_WINDOW = 1e-6
+
+# The most plies the quiescence search may add below the nominal depth of a search.
+QUIESCENCE_PLIES = 4
+
+# A position with at most this many moves is volatile, and the quiescence search tries all of its moves.
+LOW_MOBILITY = 2
+
 
 class ExceededTimeError(RuntimeError):
     """Thrown when the given function exceeded its runtime.
@@ -16,6 +30,83 @@ class ExceededTimeError(RuntimeError):
     pass
 
 
+class SearchAborted(Exception):
+    """Thrown by the search engines when no_more_time() fires. It unwinds the whole search, restoring the searched
+    state on the way, so that no value found after the deadline is ever used.
+    """
+    pass
+
+
+class SearchStats:
+    """Counters of a single search, filled in by the search engines and IterativeDeepening."""
+
+    FIELDS = ('nodes', 'leaves', 'utility_calls', 'cutoffs', 'first_move_cutoffs', 'tt_probes', 'tt_hits',
+              'completed_depth', 'elapsed')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.utility_calls = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.completed_depth = 0
+        self.elapsed = 0.0
+
+    def report(self):
+        """Returns the counters as a dict, with the derived rates.
+
+        first_move_cutoff_rate is the share of the cutoffs caused by the first move searched, which measures the
+        move ordering: a perfectly ordered tree gets all its cutoffs from the first move.
+        """
+        report = dict((field, getattr(self, field)) for field in self.FIELDS)
+        report['nodes_per_second'] = self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+        report['first_move_cutoff_rate'] = self.first_move_cutoffs / float(self.cutoffs) if self.cutoffs else 0.0
+        report['tt_hit_rate'] = self.tt_hits / float(self.tt_probes) if self.tt_probes else 0.0
+        return report
+
+
+class SearchPlayerMixin:
+    """The steps the search players share around their search: the exact endgame and the report of every move.
+
+    The player sets self.endgame (an endgame.EndgameSolver built with no_more_time=self.endgame_no_more_time),
+    self.time_manager and self.evaluation_cache.
+    """
+
+    # The share of the move's time the endgame solver may use, the rest is left for a regular search if it does not
+    # finish.
+    ENDGAME_TIME_FRACTION = 0.6
+
+    def endgame_no_more_time(self):
+        return self.time_manager.fraction_expired(self.ENDGAME_TIME_FRACTION)
+
+    def endgame_move(self, game_state):
+        """Returns the best move by solving the position exactly, or None if it is too early or time ran out."""
+        if not self.endgame.applies(game_state):
+            return None
+        try:
+            _, move = self.endgame.solve(game_state)
+        except SearchAborted:
+            return None
+        return move
+
+    def search_report(self, source, stats=None):
+        """Builds the report of a move: the search counters, how the move was found and how long it took.
+
+        :param source: 'search', 'endgame', 'ponder', 'parallel' or 'forced'.
+        :param stats: The SearchStats of the move, if it was searched.
+        """
+        report = (stats or SearchStats()).report()
+        report.update(self.evaluation_cache.report())
+        report['source'] = source
+        report['move_time'] = self.time_manager.elapsed()
+        return report
+
+
 def function_wrapper(func, args, kwargs, result_queue):
     """Runs the given function and measures its runtime.
 
@@ -63,8 +154,38 @@ def run_with_limited_time(func, args, kwargs, time_limit):
     return q_get
 
 
+def critical_moves(children):
+    """Picks the moves the quiescence search extends a leaf with.
+
+    :param children: The (move, flips) pairs of the leaf.
+    :return: A tuple: (The critical (move, flips) pairs, Whether they are all of the leaf's moves). With few moves
+             every move is critical. Otherwise only the corner captures are, and the player to move may also stand
+             pat: play a quiet move, valued by the utility.
+    """
+    if len(children) <= LOW_MOBILITY:
+        return children, True
+    return [child for child in children if tuple(child[0]) in CORNERS], False
+
+
+def selective_deepening(state, children=None):
+    """The selective deepening criterion of the search players: a corner up for grabs or a position with few moves can
+    change a lot in one move, so the search goes on past its depth there.
+
+    :param state: The state to test.
+    :param children: The state's (move, flips) pairs, if the engine already generated them.
+    """
+    if children is None:
+        children = state.get_moves_with_flips()
+    if len(children) <= LOW_MOBILITY:
+        return True
+    return any(tuple(move) in CORNERS for move, _ in children)
+
+
 class MiniMaxAlgorithm:
 
+    # Whether search() takes an alpha-beta window.
+    uses_window = False
+
     def __init__(self, utility, my_color, no_more_time, selective_deepening):
         """Initialize a MiniMax algorithms without alpha-beta pruning.
 
@@ -72,7 +193,7 @@ class MiniMaxAlgorithm:
         :param my_color: The color of the player who runs this MiniMax search.
         :param no_more_time: A function that returns true if there is no more time to run this search, or false if
                              there is still time left.
-        :param selective_deepening: A functions that gets the current state, and
+        :param selective_deepening: A functions that gets the current state and its (move, flips) pairs, and
                         returns True when the algorithm should continue the search
                         for the minimax value recursivly from this state.
                         optional
@@ -81,6 +202,11 @@ class MiniMaxAlgorithm:
         self.my_color = my_color
         self.no_more_time = no_more_time
         self.selective_deepening = selective_deepening
+        self.stats = SearchStats()
+        self.ply = 0
+        # The best (value, move) among the root moves searched so far, and how many root moves were searched.
+        self.root_best = None
+        self.root_searched = 0
 
     def search(self, state, depth, maximizing_player):
         """Start the MiniMax algorithm.
@@ -89,59 +215,177 @@ class MiniMaxAlgorithm:
         :param depth: The maximum allowed depth for the algorithm.
         :param maximizing_player: Whether this is a max node (True) or a min node (False).
         :return: A tuple: (The min max algorithm value, The move in case of max node or None in min mode)
+        :raises SearchAborted: If no_more_time() fired during the search.
         """
 
         if self.no_more_time():
-            return self.utility(state), None
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        if self.ply == 0:
+            self.root_best = None
+            self.root_searched = 0
 
-        children = state.get_possible_moves()
+        # At depth 0 the moves serve the no moves test, the selective deepening criterion and quiescence.
+        children = state.get_moves_with_flips()
 
-        if (0 == len(children)) or (0 == depth):
-            return self.utility(state), None
+        if 0 == len(children):
+            self.stats.leaves += 1
+            return self.evaluate(state), None
+        if 0 == depth:
+            return self.quiescence(state, children, QUIESCENCE_PLIES), None
 
         turn = state.curr_player
         best_move = None
 
         if turn == self.my_color:
             curr_max = -INFINITY
-            for c in children:
-                c_state = copy.deepcopy(state)
-                c_state.perform_move(c[0], c[1])
-                c_val, _ = self.search(c_state, depth - 1,not maximizing_player)
+            for c, flips in children:
+                c_val = self.search_child(state, c, flips, depth, maximizing_player)
                 if c_val > curr_max:
                     curr_max = c_val
                     best_move = c
+                if self.ply == 0:
+                    self.root_best = (curr_max, best_move)
+                    self.root_searched += 1
             return curr_max, best_move
         else:
             curr_min = INFINITY
-            best_move_for_maxinizing = children[0]
-            for c in children:
-                c_state = copy.deepcopy(state)
-                c_state.perform_move(c[0], c[1])
-                c_val, _ = self.search(c_state, depth - 1, not maximizing_player)
+            best_move_for_maxinizing = children[0][0]
+            for c, flips in children:
+                c_val = self.search_child(state, c, flips, depth, maximizing_player)
                 if c_val < curr_min:
                     curr_min = c_val
                     best_move_for_maxinizing = c
             return curr_min, best_move_for_maxinizing
 
+    def evaluate(self, state):
+        self.stats.utility_calls += 1
+        return self.utility(state)
+
+    def search_child(self, state, move, flips, depth, maximizing_player):
+        """Performs a move, searches the resulting state one ply deeper and takes the move back, even on abort.
+
+        :return: The child's value.
+        """
+        undo = state.make_move(move, flips)
+        self.ply += 1
+        try:
+            c_val, _ = self.search(state, depth - 1, not maximizing_player)
+        finally:
+            self.ply -= 1
+            state.unmake_move(undo)
+        return c_val
+
+    def quiescence(self, state, children, plies):
+        """Values a leaf, extending it over its critical moves for as long as selective_deepening finds it unstable.
+
+        :param state: The leaf's state.
+        :param children: The leaf's (move, flips) pairs. Must not be empty.
+        :param plies: The most plies the extension may still add.
+        :return: The leaf's value.
+        """
+        if plies == 0 or not self.selective_deepening(state, children):
+            self.stats.leaves += 1
+            return self.evaluate(state)
+        if self.no_more_time():
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        moves, forced = critical_moves(children)
+        maximizing = state.curr_player == self.my_color
+        best_value = None if forced else self.evaluate(state)
+        for move, flips in moves:
+            undo = state.make_move(move, flips)
+            try:
+                grandchildren = state.get_moves_with_flips()
+                if grandchildren:
+                    value = self.quiescence(state, grandchildren, plies - 1)
+                else:
+                    self.stats.leaves += 1
+                    value = self.evaluate(state)
+            finally:
+                state.unmake_move(undo)
+            if best_value is None or (value > best_value if maximizing else value < best_value):
+                best_value = value
+        return best_value
+
+
+def order_children(engine, state, children, hash_move):
+    """Orders a node's children for a windowed search engine.
+
+    The move of the engine's PV hint comes first while the search follows the hint from the root, then the hash
+    move. Without a move orderer the rest keep the order of get_moves_with_flips.
+
+    :return: The ordered list of (move, flips) pairs.
+    """
+    ply = engine.ply
+    if engine.pv_matched == ply and ply < len(engine.pv_hint):
+        hash_move = engine.pv_hint[ply]
+    if engine.move_orderer is not None:
+        return engine.move_orderer.order(state, children, ply, hash_move)
+    if hash_move is not None:
+        children.sort(key=lambda child: child[0] != hash_move)
+    return children
+
+
+def enter_child(engine, move):
+    """Moves the engine one ply down, into the child reached by move. Returns whether the child is on the PV hint."""
+    ply = engine.ply
+    on_pv = engine.pv_matched == ply and ply < len(engine.pv_hint) and move == engine.pv_hint[ply]
+    if on_pv:
+        engine.pv_matched += 1
+    engine.ply += 1
+    return on_pv
+
+
+def leave_child(engine, on_pv):
+    engine.ply -= 1
+    if on_pv:
+        engine.pv_matched -= 1
+
 
 class MiniMaxWithAlphaBetaPruning:
 
-    def __init__(self, utility, my_color, no_more_time, selective_deepening):
+    uses_window = True
+
+    def __init__(self, utility, my_color, no_more_time, selective_deepening, transposition_table=None,
+                 move_orderer=None, probcut=None):
         """Initialize a MiniMax algorithms with alpha-beta pruning.
 
         :param utility: The utility function. Should have state as parameter.
         :param my_color: The color of the player who runs this MiniMax search.
         :param no_more_time: A function that returns true if there is no more time to run this search, or false if
                              there is still time left.
-        :param selective_deepening: A functions that gets the current state, and
+        :param selective_deepening: A functions that gets the current state and its (move, flips) pairs, and
                         returns True when the algorithm should continue the search
                         for the minimax value recursivly from this state.
+        :param transposition_table: An optional transposition.TranspositionTable. The stored values are from
+                        my_color's point of view, so a table must not be shared between colors or utilities.
+        :param move_orderer: An optional move_ordering.MoveOrderer. Without it the children are searched in the order
+                        of get_moves_with_flips, except for the transposition table's best move.
+        :param probcut: An optional probcut.ProbCut, which cuts the nodes whose deep value a shallow search predicts
+                        to fall outside the window.
         """
         self.utility = utility
         self.my_color = my_color
         self.no_more_time = no_more_time
         self.selective_deepening = selective_deepening
+        self.transposition_table = transposition_table
+        self.move_orderer = move_orderer
+        self.probcut = probcut
+        self.stats = SearchStats()
+        # The distance of the current node from the root.
+        self.ply = 0
+        # The best (value, move) among the root moves searched so far, and how many root moves were searched.
+        self.root_best = None
+        self.root_searched = 0
+        # Moves to search first along the line from the root, usually the previous iteration's PV, and the length
+        # of the prefix of that line the current node lies on.
+        self.pv_hint = []
+        self.pv_matched = 0
+        # The moves of the principal variation found by the last search. Alpha-beta only follows the root move.
+        self.principal_variation = []
 
     def search(self, state, depth, alpha, beta, maximizing_player):
         """Start the MiniMax algorithm.
@@ -152,45 +396,472 @@ class MiniMaxWithAlphaBetaPruning:
         :param beta: The beta of the alpha-beta pruning.
         :param maximizing_player: Whether this is a max node (True) or a min node (False).
         :return: A tuple: (The alpha-beta algorithm value, The move in case of max node or None in min mode)
+        :raises SearchAborted: If no_more_time() fired during the search.
         """
 
         if self.no_more_time():
-            return self.utility(state), None
-
-        if (0 == len(state.get_possible_moves())) or (0 == depth) :
-                return self.utility(state), None
-
-        children = state.get_possible_moves()
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        if self.ply == 0:
+            self.root_best = None
+            self.root_searched = 0
+
+        # At depth 0 the moves serve the no moves test, the selective deepening criterion and quiescence.
+        children = state.get_moves_with_flips()
+
+        if 0 == len(children):
+            self.stats.leaves += 1
+            return self.evaluate(state), None
+        if 0 == depth:
+            return self.quiescence(state, children, alpha, beta, QUIESCENCE_PLIES), None
+
+        hash_move = None
+        table = self.transposition_table
+        if table is not None:
+            entry, value = table.lookup(state.zobrist, depth, alpha, beta)
+            self.stats.tt_probes += 1
+            if entry is not None:
+                self.stats.tt_hits += 1
+            # At the root only the hash move is used: a cutoff there would return before root_best and
+            # principal_variation are set for this search.
+            if value is not None and self.ply > 0:
+                return value, entry[4]
+            if entry is not None:
+                hash_move = entry[4]
+        if self.probcut is not None and self.ply > 0:
+            value = self.probcut_value(state, depth, alpha, beta)
+            if value is not None:
+                return value, None
+        # Searching the best move of a previous search first tightens the window early.
+        children = order_children(self, state, children, hash_move)
+        alpha_orig, beta_orig = alpha, beta
 
         turn = state.curr_player
         best_move = None
 
         if turn == self.my_color:
             curr_max = -INFINITY
-            for c in children:
-                c_state = copy.deepcopy(state)
-                c_state.perform_move(c[0], c[1])
-                c_val, _ = self.search(c_state, depth - 1, alpha, beta,not maximizing_player)
+            for index, (c, flips) in enumerate(children):
+                c_val = self.search_child(state, c, flips, depth, alpha, beta, maximizing_player)
                 if c_val > curr_max:
                     curr_max = c_val
                     best_move = c
+                if self.ply == 0:
+                    self.root_best = (curr_max, best_move)
+                    self.root_searched += 1
                 alpha = max([curr_max,alpha])
                 if curr_max >= beta:
-                    return INFINITY , best_move
+                    self.record_cutoff(c, depth, index)
+                    break
+            self.store(state, depth, alpha_orig, beta_orig, curr_max, best_move)
+            if self.ply == 0:
+                self.principal_variation = [best_move] if best_move is not None else []
             return curr_max, best_move
         else:
             curr_min = INFINITY
-            best_move_for_maximizing = children[0]
-            for c in children:
-                c_state = copy.deepcopy(state)
-                c_state.perform_move(c[0], c[1])
-                c_val, _ = self.search(c_state, depth - 1, alpha, beta, not maximizing_player)
+            best_move_for_maximizing = children[0][0]
+            for index, (c, flips) in enumerate(children):
+                c_val = self.search_child(state, c, flips, depth, alpha, beta, maximizing_player)
                 if c_val < curr_min:
                     curr_min = c_val
                     best_move_for_maximizing = c
                 beta = min([curr_min,beta])
                 if curr_min <= alpha:
-                    return -INFINITY , best_move_for_maximizing
+                    self.record_cutoff(c, depth, index)
+                    break
+            self.store(state, depth, alpha_orig, beta_orig, curr_min, best_move_for_maximizing)
             return curr_min, best_move_for_maximizing
-        print("this should never happen")
-        return self.utility(state), None
+
+    def evaluate(self, state):
+        self.stats.utility_calls += 1
+        return self.utility(state)
+
+    def search_child(self, state, move, flips, depth, alpha, beta, maximizing_player):
+        """Performs a move, searches the resulting state one ply deeper and takes the move back, even on abort.
+
+        :return: The child's value.
+        """
+        undo = state.make_move(move, flips)
+        on_pv = enter_child(self, move)
+        try:
+            c_val, _ = self.search(state, depth - 1, alpha, beta, not maximizing_player)
+        finally:
+            leave_child(self, on_pv)
+            state.unmake_move(undo)
+        return c_val
+
+    def quiescence(self, state, children, alpha, beta, plies):
+        """Values a leaf, extending it over its critical moves for as long as selective_deepening finds it unstable.
+
+        :param state: The leaf's state.
+        :param children: The leaf's (move, flips) pairs. Must not be empty.
+        :param alpha: The alpha of the alpha-beta pruning.
+        :param beta: The beta of the alpha-beta pruning.
+        :param plies: The most plies the extension may still add.
+        :return: The leaf's fail-soft value.
+        """
+        if plies == 0 or not self.selective_deepening(state, children):
+            self.stats.leaves += 1
+            return self.evaluate(state)
+        if self.no_more_time():
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        moves, forced = critical_moves(children)
+        maximizing = state.curr_player == self.my_color
+        if forced:
+            best_value = -INFINITY if maximizing else INFINITY
+        else:
+            # Standing pat: the player to move does not have to take the corner.
+            best_value = self.evaluate(state)
+            if (maximizing and best_value >= beta) or (not maximizing and best_value <= alpha):
+                return best_value
+        for move, flips in moves:
+            undo = state.make_move(move, flips)
+            try:
+                grandchildren = state.get_moves_with_flips()
+                if grandchildren:
+                    value = self.quiescence(state, grandchildren, alpha, beta, plies - 1)
+                else:
+                    self.stats.leaves += 1
+                    value = self.evaluate(state)
+            finally:
+                state.unmake_move(undo)
+            if maximizing:
+                best_value = max(best_value, value)
+                alpha = max(alpha, best_value)
+            else:
+                best_value = min(best_value, value)
+                beta = min(beta, best_value)
+            if alpha >= beta:
+                break
+        return best_value
+
+    def probcut_value(self, state, depth, alpha, beta):
+        """Tries a ProbCut on a node. ProbCut works from the point of view of the player to move, so the windows and
+        values are flipped on the opponent's nodes.
+
+        :return: The cut value, or None if the node must be searched.
+        """
+        if state.curr_player == self.my_color:
+            return self.probcut.try_cut(depth, alpha, beta,
+                                        lambda probe_depth, low, high: self.search(state, probe_depth, low, high,
+                                                                                   True)[0])
+        value = self.probcut.try_cut(depth, -beta, -alpha,
+                                     lambda probe_depth, low, high: -self.search(state, probe_depth, -high, -low,
+                                                                                 False)[0])
+        return None if value is None else -value
+
+    def record_cutoff(self, move, depth, index):
+        """Counts a cutoff by the index-th child searched, and tells the move orderer about its move."""
+        self.stats.cutoffs += 1
+        if index == 0:
+            self.stats.first_move_cutoffs += 1
+        if self.move_orderer is not None:
+            self.move_orderer.record_cutoff(move, self.ply, depth)
+
+    def store(self, state, depth, alpha, beta, value, best_move):
+        """Stores a node's fail-soft value in the transposition table."""
+        if self.transposition_table is not None:
+            self.transposition_table.store(state.zobrist, depth, bound_type(value, alpha, beta), value, best_move)
+
+
+class PrincipalVariationSearch:
+
+    uses_window = True
+
+    def __init__(self, utility, my_color, no_more_time, selective_deepening, transposition_table=None,
+                 move_orderer=None, probcut=None):
+        """Initialize a negamax Principal Variation Search.
+
+        Every node is searched from the point of view of its player to move. The first child gets the full window,
+        and the others get a null window that only proves they are no better, with a full re-search when one turns
+        out better after all. Takes the same arguments as MiniMaxWithAlphaBetaPruning, so players can switch
+        between the two.
+
+        :param utility: The utility function. Should have state as parameter, and score it for my_color.
+        :param my_color: The color of the player who runs this search.
+        :param no_more_time: A function that returns true if there is no more time to run this search, or false if
+                             there is still time left.
+        :param selective_deepening: A functions that gets the current state and its (move, flips) pairs, and
+                        returns True when the algorithm should continue the search
+                        for the minimax value recursivly from this state.
+        :param transposition_table: An optional transposition.TranspositionTable. The stored values are relative to
+                        the player to move, so a table must not be shared with MiniMaxWithAlphaBetaPruning.
+        :param move_orderer: An optional move_ordering.MoveOrderer.
+        :param probcut: An optional probcut.ProbCut.
+        """
+        self.utility = utility
+        self.my_color = my_color
+        self.no_more_time = no_more_time
+        self.selective_deepening = selective_deepening
+        self.transposition_table = transposition_table
+        self.move_orderer = move_orderer
+        self.probcut = probcut
+        self.stats = SearchStats()
+        self.ply = 0
+        # The best (value, move) among the root moves searched so far, from my_color's point of view, and how many
+        # root moves were searched.
+        self.root_best = None
+        self.root_searched = 0
+        # Moves to search first along the line from the root, see MiniMaxWithAlphaBetaPruning.
+        self.pv_hint = []
+        self.pv_matched = 0
+        # The moves of the principal variation found by the last search, starting at its root.
+        self.principal_variation = []
+
+    def search(self, state, depth, alpha, beta, maximizing_player=True):
+        """Start the search.
+
+        :param state: The state to start from.
+        :param depth: The maximum allowed depth for the algorithm.
+        :param alpha: The alpha of the window, from my_color's point of view.
+        :param beta: The beta of the window, from my_color's point of view.
+        :param maximizing_player: Ignored. Kept for compatibility with MiniMaxWithAlphaBetaPruning: negamax knows
+                        whose turn it is from the state.
+        :return: A tuple: (The value from my_color's point of view, The best move of the player to move or None)
+        :raises SearchAborted: If no_more_time() fired during the search.
+        """
+        self.ply = 0
+        self.pv_matched = 0
+        self.root_best = None
+        self.root_searched = 0
+        self.root_sign = 1 if state.curr_player == self.my_color else -1
+        if self.root_sign == 1:
+            value, pv = self.negamax(state, depth, alpha, beta)
+        else:
+            value, pv = self.negamax(state, depth, -beta, -alpha)
+            value = -value
+        self.principal_variation = pv
+        return value, (pv[0] if pv else None)
+
+    def evaluate(self, state):
+        self.stats.utility_calls += 1
+        value = self.utility(state)
+        return value if state.curr_player == self.my_color else -value
+
+    def negamax(self, state, depth, alpha, beta):
+        """Searches a node from the point of view of its player to move.
+
+        :return: A tuple: (The fail-soft value, The principal variation from this node as a list of moves)
+        """
+        if self.no_more_time():
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        children = state.get_moves_with_flips()
+
+        if 0 == len(children):
+            self.stats.leaves += 1
+            return self.evaluate(state), []
+        if 0 == depth:
+            return self.quiescence(state, children, alpha, beta, QUIESCENCE_PLIES), []
+
+        hash_move = None
+        table = self.transposition_table
+        if table is not None:
+            entry, value = table.lookup(state.zobrist, depth, alpha, beta)
+            self.stats.tt_probes += 1
+            if entry is not None:
+                self.stats.tt_hits += 1
+            # At the root only the hash move is used, see MiniMaxWithAlphaBetaPruning.search.
+            if value is not None and self.ply > 0:
+                return value, ([entry[4]] if entry[4] is not None else [])
+            if entry is not None:
+                hash_move = entry[4]
+        if self.probcut is not None and self.ply > 0:
+            value = self.probcut.try_cut(depth, alpha, beta,
+                                         lambda probe_depth, low, high: self.negamax(state, probe_depth, low, high)[0])
+            if value is not None:
+                return value, []
+        children = order_children(self, state, children, hash_move)
+        alpha_orig = alpha
+
+        best_value = -INFINITY
+        best_pv = []
+        for index, (move, flips) in enumerate(children):
+            undo = state.make_move(move, flips)
+            on_pv = enter_child(self, move)
+            try:
+                if index == 0:
+                    value, pv = self.negamax(state, depth - 1, -beta, -alpha)
+                    value = -value
+                else:
+                    value, pv = self.negamax(state, depth - 1, -alpha - NULL_WINDOW, -alpha)
+                    value = -value
+                    if alpha < value < beta:
+                        # The null window failed high: this move is better than the PV, find out by how much.
+                        value, pv = self.negamax(state, depth - 1, -beta, -alpha)
+                        value = -value
+            finally:
+                leave_child(self, on_pv)
+                state.unmake_move(undo)
+
+            if value > best_value or not best_pv:
+                best_value = value
+                best_pv = [move] + pv
+            if self.ply == 0:
+                self.root_best = (self.root_sign * best_value, best_pv[0])
+                self.root_searched += 1
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.stats.cutoffs += 1
+                if index == 0:
+                    self.stats.first_move_cutoffs += 1
+                if self.move_orderer is not None:
+                    self.move_orderer.record_cutoff(move, self.ply, depth)
+                break
+
+        if table is not None:
+            table.store(state.zobrist, depth, bound_type(best_value, alpha_orig, beta), best_value, best_pv[0])
+        return best_value, best_pv
+
+    def quiescence(self, state, children, alpha, beta, plies):
+        """Values a leaf from the point of view of its player to move, extending it over its critical moves for as
+        long as selective_deepening finds it unstable. See MiniMaxWithAlphaBetaPruning.quiescence.
+        """
+        if plies == 0 or not self.selective_deepening(state, children):
+            self.stats.leaves += 1
+            return self.evaluate(state)
+        if self.no_more_time():
+            raise SearchAborted
+        self.stats.nodes += 1
+
+        moves, forced = critical_moves(children)
+        if forced:
+            best_value = -INFINITY
+        else:
+            best_value = self.evaluate(state)
+            if best_value >= beta:
+                return best_value
+        for move, flips in moves:
+            undo = state.make_move(move, flips)
+            try:
+                grandchildren = state.get_moves_with_flips()
+                if grandchildren:
+                    value = -self.quiescence(state, grandchildren, -beta, -max(alpha, best_value), plies - 1)
+                else:
+                    self.stats.leaves += 1
+                    value = -self.evaluate(state)
+            finally:
+                state.unmake_move(undo)
+            best_value = max(best_value, value)
+            if best_value >= beta:
+                break
+        return best_value
+
+
+class IterativeDeepening:
+
+    def __init__(self, engine, no_more_time, time_remaining=None, aspiration_window=10.0, max_depth=64,
+                 stop_iterating=None):
+        """Initialize an iterative deepening driver around a search engine.
+
+        :param engine: A MiniMaxAlgorithm, MiniMaxWithAlphaBetaPruning or PrincipalVariationSearch.
+        :param no_more_time: A function that returns true if there is no more time to run this search.
+        :param time_remaining: An optional function returning the seconds left for this move. When given, no new
+                        depth is started if its projected cost exceeds the time left.
+        :param aspiration_window: The half width of the window searched around the previous iteration's value, for
+                        engines that take a window. The window is widened whenever the search fails outside it.
+        :param max_depth: The deepest iteration to run.
+        :param stop_iterating: An optional function that gets the best move of every completed depth and returns True
+                        if no new depth should be started, see time_manager.TimeManager.stop_iterating.
+        """
+        self.engine = engine
+        self.no_more_time = no_more_time
+        self.time_remaining = time_remaining
+        self.aspiration_window = aspiration_window
+        self.max_depth = max_depth
+        self.stop_iterating = stop_iterating
+        self.best_value = None
+        self.completed_depth = 0
+        self.principal_variation = []
+        self.search_alpha = -INFINITY
+
+    def search(self, state, possible_moves):
+        """Searches deeper and deeper until time runs out, and returns the best move of the last completed depth.
+
+        When the deadline aborts a depth, its result is dropped, unless the first root move (the previous best move)
+        was fully searched: then the best root move found so far is at least as good and is returned instead.
+
+        :param state: The state to search from. Its player to move must be the engine's color.
+        :param possible_moves: The moves of the state, the first of which is returned if no depth completes.
+        :return: The best move.
+        """
+        engine = self.engine
+        search_start = time.time()
+        engine.stats.reset()
+        best_move = possible_moves[0]
+        self.best_value = None
+        self.completed_depth = 0
+        self.principal_variation = []
+        if getattr(engine, 'move_orderer', None) is not None:
+            engine.move_orderer.new_search()
+
+        # There is no point in searching deeper than the end of the game.
+        empties = BOARD_SQUARES - state.disc_count(X_PLAYER) - state.disc_count(O_PLAYER)
+        max_depth = min(self.max_depth, empties)
+        prev_iteration_time = None
+        depth = 1
+        while depth <= max_depth and not self.no_more_time():
+            start = time.time()
+            self.search_alpha = -INFINITY
+            try:
+                if engine.uses_window:
+                    engine.pv_hint = list(self.principal_variation)
+                    value, move = self.aspiration_search(state, depth)
+                else:
+                    value, move = engine.search(state, depth, True)
+            except SearchAborted:
+                # Only the windowed engines search the previous best move first, see pv_hint.
+                partial = engine.root_best
+                if engine.uses_window and engine.root_searched > 0 and partial[1] is not None and \
+                        partial[0] > self.search_alpha:
+                    best_move = partial[1]
+                break
+            if move is not None:
+                best_move = move
+            self.best_value = value
+            self.completed_depth = depth
+            self.principal_variation = list(getattr(engine, 'principal_variation', None) or [best_move])
+
+            if self.stop_iterating is not None and self.stop_iterating(best_move):
+                break
+            iteration_time = time.time() - start
+            if self.time_remaining is not None and prev_iteration_time:
+                # The next iteration costs about the last one times the effective branching factor.
+                branching = min(max(iteration_time / prev_iteration_time, 2.0), 10.0)
+                if iteration_time * branching > self.time_remaining():
+                    break
+            prev_iteration_time = iteration_time
+            depth += 1
+
+        engine.stats.completed_depth = self.completed_depth
+        engine.stats.elapsed = time.time() - search_start
+        return best_move
+
+    def aspiration_search(self, state, depth):
+        """Searches a window around the previous value, widening it until the value falls inside.
+
+        :return: A tuple: (The value, The best move)
+        """
+        if self.best_value is None or abs(self.best_value) >= INFINITY:
+            return self.engine.search(state, depth, -INFINITY, INFINITY, True)
+
+        window = self.aspiration_window
+        alpha = self.best_value - window
+        beta = self.best_value + window
+        while True:
+            # A root move is only known to be good if it scored above alpha, see search().
+            self.search_alpha = alpha
+            value, move = self.engine.search(state, depth, alpha, beta, True)
+            if value <= alpha and alpha > -INFINITY:
+                window *= 4
+                alpha = max(-INFINITY, value - window)
+            elif value >= beta and beta < INFINITY:
+                window *= 4
+                beta = min(INFINITY, value + window)
+            else:
+                return value, move